@@ -0,0 +1,145 @@
+"""
+Attack masks on raw integer bitboards for esbelto.
+
+Everything here works on the bitboards of a SearchBoard or chess.Board
+(pawns, knights, ..., occupied_co) and the chess.BB_* attack tables, so no
+SquareSet or Piece is built while evaluating.
+"""
+
+import chess
+
+NOT_FILE_A = chess.BB_ALL & ~chess.BB_FILE_A
+NOT_FILE_H = chess.BB_ALL & ~chess.BB_FILE_H
+
+# SAME_PARITY[square]: the squares whose index has the same parity as square
+SAME_PARITY = [sum(chess.BB_SQUARES[other] for other in chess.SQUARES if other % 2 == square % 2)
+               for square in chess.SQUARES]
+
+
+def pawn_attacks(pawns, color):
+    """The union of the squares attacked by `pawns` of `color`."""
+    if color == chess.WHITE:
+        return ((pawns & NOT_FILE_A) << 7 | (pawns & NOT_FILE_H) << 9) & chess.BB_ALL
+    return (pawns & NOT_FILE_A) >> 9 | (pawns & NOT_FILE_H) >> 7
+
+
+def bishop_attacks(square, occupied):
+    return chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+
+
+def rook_attacks(square, occupied):
+    return (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied]
+            | chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
+
+
+def mobility(board, color):
+    """
+    Returns (knights, bishops, rooks, queens, attacked) for the pieces of `color`.
+
+    The first four are the summed number of squares attacked by the pieces of
+    that type, `attacked` is the union of every square the side attacks.
+    """
+    occupied = board.occupied
+    own = board.occupied_co[color]
+    attacked = pawn_attacks(board.pawns & own, color)
+    kings = board.kings & own
+    if kings:
+        attacked |= chess.BB_KING_ATTACKS[kings.bit_length() - 1]
+
+    knights = 0
+    pieces = board.knights & own
+    while pieces:
+        piece = pieces & -pieces
+        squares = chess.BB_KNIGHT_ATTACKS[piece.bit_length() - 1]
+        knights += squares.bit_count()
+        attacked |= squares
+        pieces ^= piece
+
+    bishops = 0
+    pieces = board.bishops & own
+    while pieces:
+        piece = pieces & -pieces
+        squares = bishop_attacks(piece.bit_length() - 1, occupied)
+        bishops += squares.bit_count()
+        attacked |= squares
+        pieces ^= piece
+
+    rooks = 0
+    pieces = board.rooks & own
+    while pieces:
+        piece = pieces & -pieces
+        squares = rook_attacks(piece.bit_length() - 1, occupied)
+        rooks += squares.bit_count()
+        attacked |= squares
+        pieces ^= piece
+
+    queens = 0
+    pieces = board.queens & own
+    while pieces:
+        piece = pieces & -pieces
+        square = piece.bit_length() - 1
+        squares = bishop_attacks(square, occupied) | rook_attacks(square, occupied)
+        queens += squares.bit_count()
+        attacked |= squares
+        pieces ^= piece
+
+    return knights, bishops, rooks, queens, attacked
+
+
+# piece values used by the static exchange evaluation, indexed by piece type
+SEE_VALUES = [0, 100, 300, 315, 500, 900, 20000]
+
+
+def attackers(board, square, occupied):
+    """The pieces of both sides in `occupied` that attack `square` through `occupied`."""
+    return ((chess.BB_PAWN_ATTACKS[chess.WHITE][square] & board.occupied_co[chess.BLACK] & board.pawns)
+            | (chess.BB_PAWN_ATTACKS[chess.BLACK][square] & board.occupied_co[chess.WHITE] & board.pawns)
+            | (chess.BB_KNIGHT_ATTACKS[square] & board.knights)
+            | (chess.BB_KING_ATTACKS[square] & board.kings)
+            | (bishop_attacks(square, occupied) & (board.bishops | board.queens))
+            | (rook_attacks(square, occupied) & (board.rooks | board.queens))) & occupied
+
+
+def see(board, move):
+    """
+    Static exchange evaluation of the int move `move` in centipawns, for the side to move.
+
+    Both sides keep recapturing on the target square with their least valuable
+    attacker for as long as it pays off. Promotions are valued as pawns.
+    """
+    from_square = move & 63
+    to_square = move >> 6 & 63
+    occupied = board.occupied ^ chess.BB_SQUARES[from_square]
+    if board.is_en_passant(move):
+        victim = chess.PAWN
+        occupied ^= chess.BB_SQUARES[board.ep_square - 8 if board.turn == chess.WHITE else board.ep_square + 8]
+    else:
+        victim = board.piece_type_at(to_square)
+
+    gains = [SEE_VALUES[victim]]
+    on_square = SEE_VALUES[board.piece_type_at(from_square)]
+    color = not board.turn
+    candidates = attackers(board, to_square, occupied)
+    pieces = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+
+    while True:
+        side = candidates & board.occupied_co[color]
+        if not side:
+            break
+        for piece_type in chess.PIECE_TYPES:
+            attacker = side & pieces[piece_type - 1]
+            if attacker:
+                break
+        if piece_type == chess.KING and candidates & board.occupied_co[not color]:
+            # the king can not recapture into a defended square
+            break
+        gains.append(on_square - gains[-1])
+        on_square = SEE_VALUES[piece_type]
+        occupied ^= attacker & -attacker
+        candidates = attackers(board, to_square, occupied)
+        color = not color
+
+    while len(gains) > 1:
+        gain = gains.pop()
+        gains[-1] = -max(-gains[-1], gain)
+    return gains[0]
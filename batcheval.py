@@ -0,0 +1,205 @@
+"""
+Batched static evaluation of esbelto with NumPy, for tune.py and bench.py --batch-eval.
+"""
+
+import chess
+import numpy as np
+from attacks import SAME_PARITY
+from evalweights import DEFAULT_WEIGHTS
+from pawnstructure import KING_PROXIMITY
+
+# columns of a stack
+PAWNS, KNIGHTS, BISHOPS, ROOKS, QUEENS, KINGS, WHITE, BLACK, TURN = range(9)
+
+# the evaluation weights with their lengths, in the order of the columns of features()
+FEATURES = [("piece_values", 5), ("knightmap", 64), ("kingmap", 64), ("king_attack", 1), ("king_file", 1),
+            ("king_rank", 1), ("bishop_mobility", 1), ("bishop_pair", 1), ("bishop_pawn_parity", 1),
+            ("knight_mobility", 1), ("knight_king_distance", 1), ("rook_mobility", 1), ("queen_mobility", 1),
+            ("passed_pawn", 1), ("passed_pawn_rank", 1), ("doubled_pawn", 1), ("king_pawn_proximity", 1)]
+COLUMNS = {}
+for name, length in FEATURES:
+    first = max((columns.stop for columns in COLUMNS.values()), default=0)
+    COLUMNS[name] = slice(first, first + length)
+
+ALL = np.uint64(chess.BB_ALL)
+NOT_FILE_A = np.uint64(chess.BB_ALL & ~chess.BB_FILE_A)
+NOT_FILE_H = np.uint64(chess.BB_ALL & ~chess.BB_FILE_H)
+EVEN = np.uint64(SAME_PARITY[0])
+ODD = np.uint64(SAME_PARITY[1])
+
+# steps of the directions north, east, north east and north west shifted left,
+# and of south, west, south west and south east shifted right, with the
+# masks of the squares a step can land on
+SHIFTS = np.array([8, 1, 9, 7], dtype=np.uint64)[:, None, None]
+UP_MASKS = np.array([chess.BB_ALL, NOT_FILE_A, NOT_FILE_A, NOT_FILE_H], dtype=np.uint64)[:, None, None]
+DOWN_MASKS = np.array([chess.BB_ALL, NOT_FILE_H, NOT_FILE_H, NOT_FILE_A], dtype=np.uint64)[:, None, None]
+
+KING_ATTACKS = np.array(chess.BB_KING_ATTACKS, dtype=np.uint64)
+PROXIMITY = np.array(KING_PROXIMITY, dtype=np.uint64)
+DISTANCE = np.array([[chess.square_distance(a, b) for b in chess.SQUARES] for a in chess.SQUARES], dtype=np.float32)
+KNIGHT_MOBILITY = np.array([attacks.bit_count() for attacks in chess.BB_KNIGHT_ATTACKS], dtype=np.float32)
+# the squared rank of a passed pawn of each color on every square, as in pawnstructure.passed_bonus
+WHITE_PASSED_RANKS = np.array([chess.square_rank(square) ** 2 for square in chess.SQUARES], dtype=np.float32)
+BLACK_PASSED_RANKS = np.array([(8 - chess.square_rank(square)) ** 2 for square in chess.SQUARES], dtype=np.float32)
+FILES = np.array([chess.square_file(square) for square in chess.SQUARES], dtype=np.float64)
+RANKS = np.array([chess.square_rank(square) for square in chess.SQUARES], dtype=np.float64)
+
+
+def row(board):
+    """The bitboards of the SearchBoard or chess.Board `board` in the columns of a stack."""
+    return (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], int(board.turn))
+
+
+def stack(boards):
+    """The SearchBoards or chess.Boards `boards` as an (n, 9) array of bitboards, see the column names."""
+    return np.array([row(board) for board in boards], dtype=np.uint64)
+
+
+def squares(bitboards):
+    """The bitboards of any shape unpacked into 0/1 squares along a new last axis of 64."""
+    bytes_ = np.ascontiguousarray(bitboards, dtype="<u8").view(np.uint8)
+    return np.unpackbits(bytes_.reshape(*np.shape(bitboards), 8), axis=-1, bitorder="little")
+
+
+def popcount(bitboards):
+    return np.bitwise_count(bitboards).astype(np.float64)
+
+
+def slider_attacks(pieces, empty):
+    """
+    Attacks of `pieces` (4 directions, n, columns) in the directions of SHIFTS,
+    towards higher and lower squares, up to and including the first blocker.
+    """
+    empty = empty[None, :, None]
+    up = pieces
+    down = pieces
+    for step in range(6):
+        up = up | ((up << SHIFTS) & UP_MASKS & empty)
+        down = down | ((down >> SHIFTS) & DOWN_MASKS & empty)
+    return (up << SHIFTS) & UP_MASKS, (down >> SHIFTS) & DOWN_MASKS
+
+
+def knight_attacks(knights):
+    """The union of the squares attacked by `knights`."""
+    not_ab = NOT_FILE_A & np.uint64(~chess.BB_FILE_B & chess.BB_ALL)
+    not_gh = NOT_FILE_H & np.uint64(~chess.BB_FILE_G & chess.BB_ALL)
+    return (((knights << np.uint64(17)) & NOT_FILE_A) | ((knights << np.uint64(15)) & NOT_FILE_H)
+            | ((knights << np.uint64(10)) & not_ab) | ((knights << np.uint64(6)) & not_gh)
+            | ((knights >> np.uint64(17)) & NOT_FILE_H) | ((knights >> np.uint64(15)) & NOT_FILE_A)
+            | ((knights >> np.uint64(10)) & not_gh) | ((knights >> np.uint64(6)) & not_ab)) & ALL
+
+
+def span(pawns, shift_up):
+    """The squares in front of `pawns` on their files, towards rank 8 if `shift_up`."""
+    eight = np.uint64(8)
+    filled = (pawns << eight) & ALL if shift_up else pawns >> eight
+    for step in range(5):
+        filled |= (filled << eight) & ALL if shift_up else filled >> eight
+    return filled
+
+
+def weight_vector(weights):
+    """The evaluation weights `weights` as a vector in the order of the columns of features()."""
+    return np.concatenate([np.asarray(weights[name], dtype=np.float64).reshape(-1) for name, length in FEATURES])
+
+
+def weights_from_vector(vector):
+    """The evaluation weights of a vector in the order of the columns of features()."""
+    weights = {}
+    for name, length in FEATURES:
+        values = vector[COLUMNS[name]].tolist()
+        weights[name] = values if isinstance(DEFAULT_WEIGHTS[name], list) else values[0]
+    return weights
+
+
+def features(bitboards):
+    """
+    The (n, len(weight_vector)) float32 matrix of the features of the (n, 9)
+    stack `bitboards`, from white's point of view. Its product with the weight
+    vector is the evaluation.
+    """
+    white = bitboards[:, WHITE]
+    black = bitboards[:, BLACK]
+    occupied = white | black
+    n = len(bitboards)
+    out = np.zeros((n, COLUMNS["king_pawn_proximity"].stop), dtype=np.float32)
+
+    # planes: (color, piece type) for white and black, pawn to king
+    pieces = bitboards[:, PAWNS:KINGS + 1]
+    planes = np.concatenate([pieces & white[:, None], pieces & black[:, None]], axis=1)
+    counts = np.bitwise_count(planes).astype(np.float32)
+    board = squares(planes)
+    wking = board[:, 5].argmax(axis=1)
+    bking = board[:, 11].argmax(axis=1)
+    # king safety and the king map with more than 10 pieces left, centralisation below
+    midgame = counts[:, [1, 2, 3, 7, 8, 9]].sum(axis=1) + 3 * counts[:, [4, 10]].sum(axis=1) > 10
+    endgame = ~midgame
+
+    out[:, COLUMNS["piece_values"]] = counts[:, 0:5] - counts[:, 6:11]
+    knights = board[:, 1].astype(np.float32) - board[:, 7]
+    out[:, COLUMNS["knightmap"]] = knights
+    out[:, COLUMNS["kingmap"]] = (board[:, 5] + board[:, 11]) * midgame[:, None]
+
+    # sliders: columns white bishops / rooks, white queens, black bishops / rooks, black queens
+    diagonal = np.stack([planes[:, 2], planes[:, 4], planes[:, 8], planes[:, 10]], axis=1)
+    straight = np.stack([planes[:, 3], planes[:, 4], planes[:, 9], planes[:, 10]], axis=1)
+    up, down = slider_attacks(np.stack([straight, straight, diagonal, diagonal]), ~occupied & ALL)
+    rays = np.bitwise_or.reduce(up | down, axis=0)
+    mobility = popcount(up) + popcount(down)
+    straightcounts = mobility[0] + mobility[1]
+    diagonalcounts = mobility[2] + mobility[3]
+
+    wpawns, bpawns = planes[:, 0], planes[:, 6]
+    wattacked = (((wpawns & NOT_FILE_A) << np.uint64(7)) | ((wpawns & NOT_FILE_H) << np.uint64(9))) & ALL
+    wattacked |= KING_ATTACKS[wking] | knight_attacks(planes[:, 1]) | rays[:, 0] | rays[:, 1]
+    battacked = ((bpawns & NOT_FILE_A) >> np.uint64(9)) | ((bpawns & NOT_FILE_H) >> np.uint64(7))
+    battacked |= KING_ATTACKS[bking] | knight_attacks(planes[:, 7]) | rays[:, 2] | rays[:, 3]
+
+    attacks = popcount(KING_ATTACKS[bking] & wattacked) - popcount(KING_ATTACKS[wking] & battacked)
+    out[:, COLUMNS["king_attack"]] = (attacks * midgame)[:, None]
+    out[:, COLUMNS["king_file"]] = (((FILES[bking] - 4) ** 2 - (FILES[wking] - 4) ** 2) * endgame)[:, None]
+    out[:, COLUMNS["king_rank"]] = ((RANKS[wking] + RANKS[bking]) * endgame)[:, None]
+
+    # bishops: pair bonus, otherwise pawns on squares of the bishop's parity
+    out[:, COLUMNS["bishop_mobility"]] = (diagonalcounts[:, 0] - diagonalcounts[:, 2])[:, None]
+    wpair = counts[:, 2] == 2
+    bpair = counts[:, 8] == 2
+    wparity = (popcount(planes[:, 2] & EVEN) * popcount(wpawns & EVEN)
+               + popcount(planes[:, 2] & ODD) * popcount(wpawns & ODD))
+    bparity = (popcount(planes[:, 8] & EVEN) * popcount(bpawns & EVEN)
+               + popcount(planes[:, 8] & ODD) * popcount(bpawns & ODD))
+    out[:, COLUMNS["bishop_pair"]] = (wpair.astype(np.float32) - bpair)[:, None]
+    out[:, COLUMNS["bishop_pawn_parity"]] = (bparity * ~bpair - wparity * ~wpair)[:, None]
+
+    out[:, COLUMNS["knight_mobility"]] = (knights @ KNIGHT_MOBILITY)[:, None]
+    distance = (np.einsum("ns,ns->n", board[:, 7], DISTANCE[bking])
+                - np.einsum("ns,ns->n", board[:, 1], DISTANCE[wking]))
+    out[:, COLUMNS["knight_king_distance"]] = distance[:, None]
+    out[:, COLUMNS["rook_mobility"]] = (straightcounts[:, 0] - straightcounts[:, 2])[:, None]
+    out[:, COLUMNS["queen_mobility"]] = (straightcounts[:, 1] + diagonalcounts[:, 1]
+                                         - straightcounts[:, 3] - diagonalcounts[:, 3])[:, None]
+
+    # pawns: passed and doubled pawns, pawns near the own king
+    passed = squares(np.stack([wpawns & ~span(bpawns, False), bpawns & ~span(wpawns, True)], axis=1))
+    passed = passed.astype(np.float32)
+    out[:, COLUMNS["passed_pawn"]] = (passed[:, 0].sum(axis=1) - passed[:, 1].sum(axis=1))[:, None]
+    out[:, COLUMNS["passed_pawn_rank"]] = (passed[:, 0] @ WHITE_PASSED_RANKS
+                                           - passed[:, 1] @ BLACK_PASSED_RANKS)[:, None]
+    files = board[:, [0, 6]].reshape(n, 2, 8, 8).sum(axis=2).astype(np.float32)
+    doubled = (files * (files - 1) / 2).sum(axis=2)
+    out[:, COLUMNS["doubled_pawn"]] = (doubled[:, 1] - doubled[:, 0])[:, None]
+    proximity = popcount(wpawns & PROXIMITY[wking]) - popcount(bpawns & PROXIMITY[bking])
+    out[:, COLUMNS["king_pawn_proximity"]] = proximity[:, None]
+    return out
+
+
+class BatchEvaluator:
+    """The evaluation of esbelto with the evaluation weights `weights`, for stacks of positions."""
+    def __init__(self, weights=DEFAULT_WEIGHTS):
+        self.vector = weight_vector(weights)
+
+    def evaluate(self, bitboards):
+        """The scores of the (n, 9) stack `bitboards` for the side to move of every row."""
+        score = np.round(features(bitboards) @ self.vector)
+        return np.where(bitboards[:, TURN] == 1, score, -score)
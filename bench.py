@@ -0,0 +1,221 @@
+"""
+Benchmark for the homemade esbelto engine.
+
+Searches a fixed set of positions with a fresh engine for each one, to a
+fixed depth and optionally for a fixed time per position, and prints the
+best move, nodes, nodes per second, transposition table hit rate, beta
+cutoffs, the share of cutoffs produced by the first move searched and the
+time to every completed depth, so that search changes can be compared on
+the same machine.
+
+    python bench.py --depth 3
+    python bench.py --depth 4 --time 2 --perft --json bench.json
+    python bench.py --depth 4 --option NullMove=false --option LateMoveReductions=false
+    python bench.py --depth 4 --threads 1 2 4 8
+    python bench.py --batch-eval
+    python bench.py --batch-eval --weights weights.json
+
+Every --option is passed to the engine like an entry of homemade_options,
+which makes it easy to A/B search features. With several --threads the
+whole set is searched once per thread count and the time to depth is
+compared against the first count. --perft adds the perft.py positions to
+measure the move generator alone. --batch-eval compares the cost per
+position of esbelto.eval and of the NumPy evaluation of batcheval.py at
+several batch sizes, on the positions two moves deep from the benchmark
+positions. With --json the results are also written as JSON, to compare
+two commits without parsing the text output.
+"""
+
+import argparse
+import json
+import platform
+import time
+import yaml
+import chess
+import chess.engine
+import perft
+import strategies
+from searchboard import SearchBoard
+from transposition import EvalTable
+
+POSITIONS = [
+    ("startpos", chess.STARTING_FEN),
+    ("italian", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("queens gambit", "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4"),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("middlegame", "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10"),
+    ("tactical", "r1b1kb1r/pppp1ppp/5q2/4n3/3KP3/2N3PN/PPP4P/R1BQ1B1R b kq - 0 1"),
+    ("mate in two", "r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 8"),
+    ("rook endgame", "8/8/4k3/3r4/8/3RK3/4P3/8 w - - 0 1"),
+    ("pawn endgame", "8/5k2/3p4/1p1Pp2p/pP2Pp1P/P4P1K/8/8 b - - 99 50"),
+    ("queen endgame", "8/8/1p1q1pk1/p5p1/P2Q4/1P4PP/5PK1/8 w - - 0 40"),
+]
+
+# iterative deepening depth limit of the fixed time searches
+TIMED_MAX_DEPTH = 64
+# stack sizes of --batch-eval
+BATCH_SIZES = (1, 32, 256)
+
+
+def parse_option(text):
+    name, _, value = text.partition("=")
+    return name, yaml.safe_load(value)
+
+
+def bench_position(fen, depth, hash_size, options=None, movetime=None):
+    """Searches `fen` to `depth`, or for `movetime` seconds if given, and returns the statistics."""
+    engine = strategies.esbelto([], {"Hash": hash_size, **(options or {})}, None, {})
+    if movetime:
+        engine.maxdepth = TIMED_MAX_DEPTH
+    limit = chess.engine.Limit(time=movetime) if movetime else chess.engine.Limit(depth=depth)
+    start = time.perf_counter()
+    result = engine.search(chess.Board(fen), limit, False, False)
+    elapsed = time.perf_counter() - start
+    engine.quit()
+    return {"move": result.move.uci(), "depth": engine.completed[0], "nodes": engine.nodes,
+            "nps": int(engine.nodes / elapsed), "tt_hit_rate": engine.tthits / max(1, engine.ttprobes),
+            "cutoffs": engine.cutoff, "first_move_cutoffs": engine.firstcutoff, "time": elapsed,
+            "time_to_depth": [{"depth": depth, "time": seconds, "nodes": nodes}
+                              for depth, seconds, nodes in engine.iterations]}
+
+
+def bench_set(depth, hash_size, options, movetime=None):
+    """Searches every position and prints a line per position, returns the results and their totals."""
+    results = []
+    for name, fen in POSITIONS:
+        stats = bench_position(fen, depth, hash_size, options, movetime)
+        results.append({"name": name, "fen": fen, **stats})
+        first = 100 * stats["first_move_cutoffs"] / max(1, stats["cutoffs"])
+        print(f"{name:<15} move: {stats['move']:<6} depth: {stats['depth']:>2} nodes: {stats['nodes']:>8} "
+              f"nps: {stats['nps']:>6} tt hits: {100 * stats['tt_hit_rate']:5.1f}% cutoffs: {stats['cutoffs']:>8} "
+              f"first move: {first:5.1f}% time: {stats['time']:.2f}s")
+
+    total_nodes = sum(stats["nodes"] for stats in results)
+    total_time = sum(stats["time"] for stats in results)
+    total_cutoffs = sum(stats["cutoffs"] for stats in results)
+    total_first = sum(stats["first_move_cutoffs"] for stats in results)
+    total = {"nodes": total_nodes, "time": total_time, "nps": int(total_nodes / total_time),
+             "first_move_cutoff_rate": total_first / max(1, total_cutoffs)}
+    print(f"total nodes: {total_nodes} time: {total_time:.2f}s nps: {total['nps']} "
+          f"first move cutoffs: {100 * total['first_move_cutoff_rate']:.1f}%")
+    return {"positions": results, "total": total}
+
+
+def bench_perft():
+    """Runs the perft.py positions on the SearchBoard and returns nodes and speed of each."""
+    results = []
+    for name, fen, chess960, depth in perft.POSITIONS:
+        board = SearchBoard(chess.Board(fen, chess960=chess960))
+        start = time.perf_counter()
+        nodes = perft.perft(board, depth)
+        elapsed = time.perf_counter() - start
+        results.append({"name": name, "depth": depth, "nodes": nodes, "time": elapsed, "nps": int(nodes / elapsed)})
+        print(f"perft {name:<15} depth: {depth} nodes: {nodes:>9} time: {elapsed:.2f}s nps: {int(nodes / elapsed)}")
+    return results
+
+
+def leaf_positions(psqt):
+    """The positions two moves deep from POSITIONS, as SearchBoards."""
+    boards = []
+    for name, fen in POSITIONS:
+        board = SearchBoard(chess.Board(fen), psqt)
+        for move in board.generate_moves():
+            board.push(move)
+            for reply in board.generate_moves():
+                board.push(reply)
+                boards.append(SearchBoard.from_board(board.to_board(), psqt))
+                board.pop()
+            board.pop()
+    return boards
+
+
+def bench_batch_eval(options, repeat=3):
+    """Times esbelto.eval and BatchEvaluator per position, batches include building the stack."""
+    # NumPy is only needed for this benchmark
+    import batcheval
+
+    engine = strategies.esbelto([], {**options, "Hash": 1}, None, {})
+    engine.nodes = 0
+    boards = leaf_positions(engine.psqt)
+    evaluator = batcheval.BatchEvaluator(engine.weights)
+    results = []
+
+    best = None
+    for run in range(repeat):
+        engine.evaltt = EvalTable()
+        start = time.perf_counter()
+        scores = [engine.eval(board) for board in boards]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results.append({"evaluator": "eval", "batch": 1, "us_per_position": 1e6 * best / len(boards)})
+
+    for size in BATCH_SIZES:
+        best = None
+        for run in range(repeat):
+            start = time.perf_counter()
+            batches = [evaluator.evaluate(batcheval.stack(boards[i:i + size])) for i in range(0, len(boards), size)]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        mismatches = sum(1 for got, want in zip((score for batch in batches for score in batch), scores)
+                         if abs(got - want) > 1e-6)
+        results.append({"evaluator": "batch", "batch": size, "us_per_position": 1e6 * best / len(boards),
+                        "mismatches": mismatches})
+
+    engine.quit()
+    for result in results:
+        print(f"{result['evaluator']:<6} batch: {result['batch']:>4} positions: {len(boards)} "
+              f"per position: {result['us_per_position']:8.1f}us mismatches: {result.get('mismatches', 0)}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark for esbelto")
+    parser.add_argument("--depth", type=int, default=3, help="Iterative deepening depth to search every position to.")
+    parser.add_argument("--time", type=float, help="Also search every position for this many seconds.")
+    parser.add_argument("--hash", type=int, default=16, help="Transposition table size in megabytes.")
+    parser.add_argument("--option", type=parse_option, action="append", default=[], metavar="NAME=VALUE",
+                        help="Engine option, as in homemade_options. Can be given several times.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[None],
+                        help="Search with each of these Threads settings and compare the time to depth.")
+    parser.add_argument("--perft", action="store_true", help="Also time the move generator on the perft positions.")
+    parser.add_argument("--batch-eval", action="store_true",
+                        help="Also compare the cost per position of eval and of batched NumPy evaluation.")
+    parser.add_argument("--weights", metavar="FILE",
+                        help="Evaluation weights file as written by tune.py, like EvalWeights in homemade_options.")
+    parser.add_argument("--json", metavar="FILE", help="Write the results to FILE as JSON.")
+    args = parser.parse_args()
+    options = dict(args.option)
+    if args.weights:
+        options["EvalWeights"] = args.weights
+
+    report = {"python": platform.python_version(), "depth": args.depth, "time": args.time,
+              "hash": args.hash, "options": dict(options), "runs": []}
+    for threads in args.threads:
+        if threads is not None:
+            print(f"threads: {threads}")
+            options["Threads"] = threads
+        run = {"threads": threads, "fixed_depth": bench_set(args.depth, args.hash, options)}
+        if args.time:
+            print(f"fixed time: {args.time}s")
+            run["fixed_time"] = bench_set(args.depth, args.hash, options, args.time)
+        report["runs"].append(run)
+
+    if len(report["runs"]) > 1:
+        first = report["runs"][0]["fixed_depth"]["total"]["time"]
+        for run in report["runs"]:
+            elapsed = run["fixed_depth"]["total"]["time"]
+            print(f"threads: {run['threads']:>2} time to depth {args.depth}: {elapsed:.2f}s speedup: {first / elapsed:.2f}")
+
+    if args.perft:
+        report["perft"] = bench_perft()
+
+    if args.batch_eval:
+        report["batch_eval"] = bench_batch_eval(options)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -107,6 +107,9 @@ class EngineWrapper:
 
     def search(self, board, time_limit, ponder, draw_offered):
         result = self.engine.play(board, time_limit, info=chess.engine.INFO_ALL, ponder=ponder, draw_offered=draw_offered)
+        return self.process_result(board, result)
+
+    def process_result(self, board, result):
         self.last_move_info = result.info.copy()
         self.scores.append(self.last_move_info.get("score", chess.engine.PovScore(chess.engine.Mate(1), board.turn)))
         result = self.offer_draw_or_resign(result, board)
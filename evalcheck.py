@@ -0,0 +1,217 @@
+"""
+Checks the incremental evaluation sums of the SearchBoard against a full evaluation.
+
+Plays random games on a SearchBoard copy of the game. In every position the
+incremental psqtscore and kingscore must equal full_psqt, the material and
+piece-square sum computed from scratch as eval did before the sums were
+incremental. The terms of eval must equal the old square by square code with
+SquareSets, len(game.attacks()) and is_attacked_by, and
+the eval of the board the eval of a board built from scratch for the same
+position by a second engine.
+
+    python evalcheck.py
+    python evalcheck.py --games 500 --seed 7
+"""
+
+import argparse
+import random
+import chess
+import strategies
+from attacks import mobility
+from searchboard import SearchBoard
+
+PIECE_VALUES = [0, 100, 300, 315, 500, 900, 0]
+
+
+def full_psqt(board, engine):
+    """(psqtscore, kingscore) of `board` summed over all pieces."""
+    psqtscore = 0
+    for square, piece in board.piece_map().items():
+        if piece.piece_type == chess.KING:
+            continue
+        value = PIECE_VALUES[piece.piece_type]
+        if piece.piece_type == chess.KNIGHT:
+            value += engine.knightmap[square]
+        psqtscore += value if piece.color == chess.WHITE else -value
+    kingscore = engine.kingmap[board.king(chess.WHITE)] + engine.kingmap[board.king(chess.BLACK)]
+    return psqtscore, kingscore
+
+
+def old_pawns(game):
+    """The pawn term of eval as it was computed square by square before pawnstructure.py, default weights."""
+    wking = game.king(chess.WHITE)
+    bking = game.king(chess.BLACK)
+    s = 0
+    for p in game.pieces(chess.PAWN, chess.WHITE):
+        r = chess.square_rank(p)
+        passed = True
+        for i in range(8-r):
+            if (p+8*(1+i)) < 56:
+                if game.piece_at(p+8*(1+i)) == chess.Piece(1, chess.BLACK): passed = False
+                elif game.piece_at(p+8*(1+i)) == chess.Piece(1, chess.WHITE): s -= 40
+        if passed:
+            s = s + 40 + 2*(r**2)
+        if chess.square_distance(p, wking) < 3: s = s + 30
+
+    for p in game.pieces(chess.PAWN, chess.BLACK):
+        r = chess.square_rank(p)
+        passed = True
+        for i in range(r):
+            if (p-8*(1+i)) > 7:
+                if game.piece_at(p-8*(1+i)) == chess.Piece(1, chess.WHITE): passed = False
+                elif game.piece_at(p-8*(1+i)) == chess.Piece(1, chess.BLACK): s += 40
+        if passed:
+            s = s - 40 - 2*((8-r)**2)
+        if chess.square_distance(p, bking) < 3: s = s - 30
+
+    return s
+
+
+def old_pieces(game):
+    return (len(game.pieces(chess.KNIGHT, chess.WHITE)) + len(game.pieces(chess.KNIGHT, chess.BLACK))
+            + len(game.pieces(chess.BISHOP, chess.WHITE)) + len(game.pieces(chess.BISHOP, chess.BLACK))
+            + len(game.pieces(chess.ROOK, chess.WHITE)) + len(game.pieces(chess.ROOK, chess.BLACK))
+            + 3*(len(game.pieces(chess.QUEEN, chess.WHITE)) + len(game.pieces(chess.QUEEN, chess.BLACK))))
+
+
+def old_kingposition(nofpieces, game, kingscore):
+    """The king term of eval as it was computed with SquareSets before attacks.py, default weights."""
+    wking = game.king(chess.WHITE)
+    bking = game.king(chess.BLACK)
+    if nofpieces > 10:
+        score = 0
+        for s in game.attacks(wking):
+            if game.is_attacked_by(chess.BLACK, s):
+                score -= 20
+        for s in game.attacks(bking):
+            if game.is_attacked_by(chess.WHITE, s):
+                score += 20
+        return kingscore + score
+    else:
+        w = (chess.square_file(wking) - 4)**2
+        b = (chess.square_file(bking) - 4)**2
+        return -w + (chess.square_rank(wking)*3) + b + (chess.square_rank(bking)*3)
+
+
+def old_bishops(game):
+    score = 0
+    wbs = game.pieces(chess.BISHOP, chess.WHITE)
+    bbs = game.pieces(chess.BISHOP, chess.BLACK)
+    if len(wbs) == 2:
+        for wb in wbs:
+            score += 2*len(game.attacks(wb)) + 35
+    else:
+        for wb in wbs:
+            score += 2*len(game.attacks(wb))
+            for wp in game.pieces(chess.PAWN, chess.WHITE):
+                if wp%2 == wb%2:
+                    score = score - 14
+
+    if len(bbs) == 2:
+        for bb in bbs:
+            score = score - 2*len(game.attacks(bb)) - 35
+    else:
+        for bb in bbs:
+            score = score - 2*len(game.attacks(bb))
+            for bp in game.pieces(chess.PAWN, chess.BLACK):
+                if bp%2 == bb%2:
+                    score = score + 14
+    return score
+
+
+def old_knights(game):
+    score = 0
+    for i in game.pieces(chess.KNIGHT, chess.WHITE):
+        score = score - 2*(chess.square_distance(i, game.king(chess.WHITE)) - len(game.attacks(i)))
+    for j in game.pieces(chess.KNIGHT, chess.BLACK):
+        score = score + 2*(chess.square_distance(j, game.king(chess.BLACK)) - len(game.attacks(j)))
+    return score
+
+
+def old_rooks(game):
+    s = 0
+    for r in game.pieces(chess.ROOK, chess.WHITE):
+        s += len(game.attacks(r))
+    for r in game.pieces(chess.ROOK, chess.BLACK):
+        s -= len(game.attacks(r))
+    return s
+
+
+def old_queens(game):
+    s = 0
+    for q in game.pieces(chess.QUEEN, chess.WHITE):
+        s += len(game.attacks(q))/2
+    for q in game.pieces(chess.QUEEN, chess.BLACK):
+        s = s - len(game.attacks(q))/2
+    return s
+
+
+def check_terms(engine, board, game):
+    """Compares the terms of eval on `board` with the old code on the chess.Board `game`, returns the mismatches."""
+    engine.wking = game.king(chess.WHITE)
+    engine.bking = game.king(chess.BLACK)
+    engine.wmob = mobility(board, chess.WHITE)
+    engine.bmob = mobility(board, chess.BLACK)
+    nofpieces = engine.pieces(board)
+    errors = []
+    for name, new, old in (("pawns", engine.pawns(board), old_pawns(game)),
+                           ("pieces", nofpieces, old_pieces(game)),
+                           ("kingposition", engine.kingposition(nofpieces, board),
+                            old_kingposition(nofpieces, game, full_psqt(game, engine)[1])),
+                           ("bishops", engine.bishops(board), old_bishops(game)),
+                           ("knights", engine.knights(board), old_knights(game)),
+                           ("rooks", engine.rooks(board), old_rooks(game)),
+                           ("queens", engine.queens(board), old_queens(game))):
+        if new != old:
+            errors.append(f"{name} {new} {old} {game.fen()}")
+    return errors
+
+
+def check_game(rng, engine, fresh):
+    """Plays one random game, returns the number of positions compared and a list of mismatches."""
+    game = chess.Board()
+    board = SearchBoard.from_board(game, engine.psqt)
+    errors = []
+    checked = 0
+    while not game.is_game_over() and game.ply() < 300:
+        move = rng.choice(list(game.legal_moves))
+        game.push(move)
+        board.push(board.from_chess_move(move))
+        checked += 1
+        if (board.psqtscore, board.kingscore) != full_psqt(game, engine):
+            errors.append(f"sums {(board.psqtscore, board.kingscore)} {full_psqt(game, engine)} {game.fen()}")
+        errors += check_terms(engine, board, game)
+        incremental = engine.eval(board)
+        scratch = fresh.eval(SearchBoard.from_board(chess.Board(game.fen()), fresh.psqt))
+        if incremental != scratch:
+            errors.append(f"eval {incremental} {scratch} {game.fen()}")
+    return checked, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the incremental evaluation against a full evaluation")
+    parser.add_argument("--games", type=int, default=100, help="Random games to play.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random games.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine, fresh = (strategies.esbelto([], {"Hash": 1}, None, {}) for copy in range(2))
+    for copy in (engine, fresh):
+        copy.nodes = 0
+        copy.movenumber = 1
+
+    checked = 0
+    errors = []
+    for game in range(args.games):
+        game_checked, game_errors = check_game(rng, engine, fresh)
+        checked += game_checked
+        errors += game_errors
+    print(f"games: {args.games} positions: {checked} mismatches: {len(errors)}")
+    for error in errors[:10]:
+        print(f"    {error}")
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Weights of the esbelto evaluation, the defaults and the JSON files tune.py writes over them.
+"""
+
+import json
+
+# Fractional weights are kept to multiples of 1/STEP centipawn. Sums of such
+# numbers are exact in binary floating point, so esbelto.eval and the batched
+# evaluation round the same sum whatever order they add the terms in.
+STEP = 64
+
+DEFAULT_WEIGHTS = {
+    # pawn, knight, bishop, rook, queen
+    "piece_values": [100, 300, 315, 500, 900],
+    # added to the knights of white and subtracted for the knights of black, on the same square
+    "knightmap": [
+        -10, -10, -10, -10, -10, -10, -10, -10,
+        -10, -10,  -5,   0,   0,  -5,  -5, -10,
+        -10,  -5,  10,   0,   0,  10,  -5, -10,
+         -5,   0,  10,  20,  20,  10,   0,  -5,
+         -5,   0,  10,  20,  20,  10,   0,  -5,
+        -10,  -5,  10,   0,   0,  10,  -5, -10,
+        -10, -10,  -5,   0,   0,  -5, -10, -10,
+        -10, -10, -10, -10, -10, -10, -10, -10,
+    ],
+    # added for both kings while more than 10 pieces are left, see esbelto.kingposition
+    "kingmap": [
+         10,  18,  20, -50,   0, -50,  30,  27,
+          0,  -5,   0, -80,-100, -80,   5,   5,
+        -10, -20, -50, -50, -50, -50, -20, -10,
+         -5, -20,  -5, -10, -10,  -5, -20,  -5,
+         -5,   0,   5,  10,  10,   5,   0,  -5,
+         10,  20,  50,  50,  50,  50,  20,  10,
+          0,   5,  10,  80, 100,  80,   0, -10,
+        -10, -18, -20,  50,   0,  50, -30, -27,
+    ],
+    # squares next to the enemy king attacked by a side, while more than 10 pieces are left
+    "king_attack": 20,
+    # endgame king: squared distance of the file from the e file and the rank
+    "king_file": 1,
+    "king_rank": 3,
+    "bishop_mobility": 2,
+    "bishop_pair": 70,
+    # penalty for every own pawn on a square of the bishop's parity, without the pair
+    "bishop_pawn_parity": 14,
+    "knight_mobility": 2,
+    # penalty for every step between a knight and its own king
+    "knight_king_distance": 2,
+    "rook_mobility": 1,
+    "queen_mobility": 0.5,
+    # a passed pawn is worth passed_pawn + passed_pawn_rank * rank**2, counted from its own side
+    "passed_pawn": 40,
+    "passed_pawn_rank": 2,
+    # penalty for every pawn in front of another of its color on a file
+    "doubled_pawn": 40,
+    # own pawns at most two king steps from the king
+    "king_pawn_proximity": 30,
+}
+
+
+def load_weights(path=None):
+    """The weights of the JSON file `path` merged over DEFAULT_WEIGHTS, the defaults without a path."""
+    weights = dict(DEFAULT_WEIGHTS)
+    if path:
+        with open(path) as file:
+            loaded = json.load(file)
+        unknown = loaded.keys() - DEFAULT_WEIGHTS.keys()
+        if unknown:
+            raise ValueError(f"unknown evaluation weights in {path}: {', '.join(sorted(unknown))}")
+        weights.update(loaded)
+    for name, value in weights.items():
+        if not isinstance(value, list):
+            weights[name] = quantize(value)
+    return weights
+
+
+def quantize(value):
+    """`value` rounded to a multiple of 1/STEP, as an int when it is whole."""
+    value = round(float(value) * STEP) / STEP
+    return int(value) if value.is_integer() else value
+
+
+def save_weights(weights, path):
+    """Writes `weights` to `path` as JSON, piece values and maps rounded to whole centipawns, the rest quantized."""
+    rounded = {}
+    for name, value in weights.items():
+        if isinstance(DEFAULT_WEIGHTS[name], list):
+            rounded[name] = [round(item) for item in value]
+        else:
+            rounded[name] = quantize(value)
+    with open(path, "w") as file:
+        json.dump(rounded, file, indent=2)
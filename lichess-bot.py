@@ -21,6 +21,7 @@ from functools import partial
 from requests.exceptions import ChunkedEncodingError, ConnectionError, HTTPError, ReadTimeout
 from urllib3.exceptions import ProtocolError
 from ColorLogger import enable_color_logging
+from transposition import TranspositionTable
 from collections import defaultdict
 from http.client import RemoteDisconnected
 
@@ -98,10 +99,27 @@ def game_logging_configurer(queue, level):
         root.setLevel(level)
 
 
+def create_shared_table(config):
+    # With SharedHash in homemade_options the homemade engines of all games attach to one
+    # transposition table in shared memory instead of allocating their own.
+    cfg = config["engine"]
+    options = cfg.get("homemade_options") or {}
+    if cfg.get("protocol") != "homemade" or not options.get("SharedHash") or options.get("Deterministic"):
+        return None
+    # every game starts a generation for each move it searches and each ponder search, entries
+    # stay protected for as long as the searches of all games in play could still use them
+    window = 2 * config["challenge"].get("concurrency", 1)
+    table = TranspositionTable(options["SharedHash"], shared=True, window=window)
+    options["SharedHashName"] = table.name
+    logger.info(f"Shared transposition table of {options['SharedHash']} MB in {table.name}")
+    return table
+
+
 def start(li, user_profile, engine_factory, config, logging_level, log_filename, one_game=False):
     challenge_config = config["challenge"]
     max_games = challenge_config.get("concurrency", 1)
     logger.info(f"You're now connected to {config['url']} and awaiting challenges.")
+    shared_table = create_shared_table(config)
     manager = multiprocessing.Manager()
     challenge_queue = manager.list()
     control_queue = manager.Queue()
@@ -227,6 +245,8 @@ def start(li, user_profile, engine_factory, config, logging_level, log_filename,
     correspondence_pinger.join()
     logging_listener.terminate()
     logging_listener.join()
+    if shared_table:
+        shared_table.close()
 
 
 @backoff.on_exception(backoff.expo, BaseException, max_time=600, giveup=is_final)
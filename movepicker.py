@@ -0,0 +1,85 @@
+"""
+Move ordering for the esbelto search.
+"""
+
+import chess
+
+MAX_PLY = 128
+
+# most valuable victim first, then least valuable attacker
+MVV_LVA = [[8*victim - attacker for attacker in range(7)] for victim in range(7)]
+
+
+class MoveOrdering:
+    """
+    Killer moves and history scores shared by the nodes of a search.
+
+    moves() hands out the moves of a node in stages and every stage is only
+    generated when the previous ones did not produce a cutoff:
+
+    1. the transposition table move
+    2. captures and queen promotions, most valuable victim / least valuable attacker first
+    3. the two killer moves of the ply
+    4. the remaining quiet moves, by history score
+    """
+    def __init__(self):
+        self.killers = [[0, 0] for ply in range(MAX_PLY)]
+        # history[color][from_square | to_square << 6], the low bits of the int move
+        self.history = [[0] * 4096, [0] * 4096]
+
+    def clear(self):
+        """Forgets the killers and fades the history before a new search."""
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        for table in self.history:
+            for index in range(4096):
+                table[index] >>= 1
+
+    def update(self, board, move, depth, ply):
+        """Records a quiet move that caused a beta cutoff."""
+        if board.is_capture(move) or move >> 12:
+            return
+        killers = self.killers[min(ply, MAX_PLY - 1)]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[board.turn][move & 0xFFF] += depth * depth
+
+    def moves(self, board, ttmove, ply):
+        """Yields every legal move of the SearchBoard `board` once, best candidates first."""
+        if ttmove and board.is_legal(ttmove):
+            yield ttmove
+        else:
+            ttmove = 0
+
+        noisy = []
+        enemy = board.occupied_co[not board.turn]
+        for move in board.generate_moves(quiets=False, promotions=True):
+            if move == ttmove:
+                continue
+            promotion = move >> 12
+            if enemy & chess.BB_SQUARES[move >> 6 & 63] or move >> 6 & 63 == board.ep_square:
+                attacker = board.piece_type_at(move & 63)
+                victim = board.piece_type_at(move >> 6 & 63) or chess.PAWN
+                noisy.append((MVV_LVA[victim][attacker] + (40 if promotion == chess.QUEEN else 0), move))
+            elif promotion == chess.QUEEN:
+                noisy.append((MVV_LVA[chess.QUEEN][chess.PAWN], move))
+        noisy.sort(key=lambda x: x[0], reverse=True)
+        for score, move in noisy:
+            yield move
+
+        killers = []
+        for killer in self.killers[min(ply, MAX_PLY - 1)]:
+            if killer and killer != ttmove and not board.is_capture(killer) and board.is_legal(killer):
+                killers.append(killer)
+                yield killer
+
+        history = self.history[board.turn]
+        quiets = []
+        for move in board.generate_moves(captures=False):
+            if move == ttmove or move in killers or move >> 12 == chess.QUEEN:
+                continue
+            quiets.append((history[move & 0xFFF], move))
+        quiets.sort(key=lambda x: x[0], reverse=True)
+        for score, move in quiets:
+            yield move
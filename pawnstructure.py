@@ -0,0 +1,93 @@
+"""
+Pawn structure evaluation on bitboards for esbelto, cached by the pawn Zobrist key.
+"""
+
+from array import array
+import chess
+
+# FRONT_SPANS[color][square]: the squares in front of a pawn on its file
+FRONT_SPANS = [[0] * 64, [0] * 64]
+# KING_PROXIMITY[square]: squares at most two king steps away
+KING_PROXIMITY = [0] * 64
+
+for square in chess.SQUARES:
+    rank = chess.square_rank(square)
+    file = chess.BB_FILES[chess.square_file(square)]
+    FRONT_SPANS[chess.WHITE][square] = file & chess.BB_ALL & ~((1 << 8*(rank+1)) - 1)
+    FRONT_SPANS[chess.BLACK][square] = file & ((1 << 8*rank) - 1)
+    for other in chess.SQUARES:
+        if chess.square_distance(square, other) < 3:
+            KING_PROXIMITY[square] |= chess.BB_SQUARES[other]
+
+
+def passed_bonus(passed=40, rank_bonus=2):
+    """The bonus of a passed pawn of each color on each square, [color][square]."""
+    return [[passed + rank_bonus*((8-chess.square_rank(square))**2) for square in chess.SQUARES],
+            [passed + rank_bonus*(chess.square_rank(square)**2) for square in chess.SQUARES]]
+
+
+def doubled_penalty(doubled=40):
+    """The penalty of n pawns of one color on a file, `doubled` for each pawn in front of another."""
+    return [doubled * (n * (n - 1) // 2) for n in range(9)]
+
+
+PASSED_BONUS = passed_bonus()
+DOUBLED_PENALTY = doubled_penalty()
+
+
+def pawnstructure(white_pawns, black_pawns, passed=PASSED_BONUS, doubled=DOUBLED_PENALTY):
+    """
+    Passed and doubled pawn score from white's point of view, with the tables `passed` and `doubled`.
+
+    A pawn is passed when no enemy pawn stands in front of it on its file, and
+    a file with n pawns of one color costs doubled[n]. Both are integer ANDs
+    with the precomputed front span and file masks.
+    """
+    score = 0
+
+    pawns = white_pawns
+    while pawns:
+        pawn = pawns & -pawns
+        square = pawn.bit_length() - 1
+        if not black_pawns & FRONT_SPANS[chess.WHITE][square]:
+            score += passed[chess.WHITE][square]
+        pawns ^= pawn
+
+    pawns = black_pawns
+    while pawns:
+        pawn = pawns & -pawns
+        square = pawn.bit_length() - 1
+        if not white_pawns & FRONT_SPANS[chess.BLACK][square]:
+            score -= passed[chess.BLACK][square]
+        pawns ^= pawn
+
+    for file in chess.BB_FILES:
+        score -= doubled[(white_pawns & file).bit_count()]
+        score += doubled[(black_pawns & file).bit_count()]
+
+    return score
+
+
+class PawnHashTable:
+    """
+    A direct-mapped cache of pawnstructure() scores with 2**bits entries,
+    with the tables `passed` and `doubled`, keyed by the pawn Zobrist key of
+    the SearchBoard.
+
+    Positions without pawns have key 0, which the empty table already maps to 0.
+    """
+    def __init__(self, bits=14, passed=PASSED_BONUS, doubled=DOUBLED_PENALTY):
+        self.passed = passed
+        self.doubled = doubled
+        self.mask = (1 << bits) - 1
+        self.keys = array("Q", [0]) * (1 << bits)
+        self.scores = array("d", [0]) * (1 << bits)
+
+    def score(self, key, white_pawns, black_pawns):
+        index = key & self.mask
+        if self.keys[index] == key:
+            return self.scores[index]
+        score = pawnstructure(white_pawns, black_pawns, self.passed, self.doubled)
+        self.keys[index] = key
+        self.scores[index] = score
+        return score
@@ -0,0 +1,134 @@
+"""
+Perft for the SearchBoard of the homemade esbelto engine.
+
+Counts the leaf nodes of the legal move tree of a set of test positions with
+SearchBoard and with python-chess, fails on the first count that differs and
+prints the speed of both, so that changes to the move generation can be
+checked and timed. Every position is also walked with the Zobrist key of
+SearchBoard checked against chess.polyglot.zobrist_hash.
+
+    python perft.py
+    python perft.py --depth 4
+    python perft.py --divide "<fen>" --depth 3
+"""
+
+import argparse
+import sys
+import time
+import chess
+import chess.polyglot
+from searchboard import SearchBoard
+
+# (name, fen, chess960, depth), the depths keep the whole set under a minute
+POSITIONS = [
+    ("startpos", chess.STARTING_FEN, False, 4),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", False, 3),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", False, 5),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", False, 4),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", False, 3),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", False, 3),
+    ("en passant pin", "8/8/8/K2pP2r/8/8/8/7k w - d6 0 2", False, 5),
+    ("chess960", "bqnb1rkr/pp3ppp/3ppn2/2p5/5P2/P2P4/NPP1P1PP/BQ1BNRKR w HFhf - 2 9", True, 4),
+]
+
+
+def perft(board, depth):
+    if depth == 1:
+        return len(board.generate_moves())
+    nodes = 0
+    for move in board.generate_moves():
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def chess_perft(board, depth):
+    if depth == 1:
+        return board.legal_moves.count()
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += chess_perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def check_keys(board, chess_board, depth):
+    """Walks the tree and compares every key and move list with python-chess, returns the first mismatch or None."""
+    if board.key != chess.polyglot.zobrist_hash(chess_board):
+        return f"key differs after {' '.join(move.uci() for move in chess_board.move_stack)}"
+    moves = sorted(board.uci(move) for move in board.generate_moves())
+    expected = sorted(move.uci() for move in chess_board.legal_moves)
+    if moves != expected:
+        return (f"moves differ after {' '.join(move.uci() for move in chess_board.move_stack)}: "
+                f"{sorted(set(moves) ^ set(expected))}")
+    if depth == 0:
+        return None
+    for move in board.generate_moves():
+        chess_board.push(board.to_chess_move(move))
+        board.push(move)
+        error = check_keys(board, chess_board, depth - 1)
+        board.pop()
+        chess_board.pop()
+        if error:
+            return error
+    return None
+
+
+def divide(fen, depth):
+    chess_board = chess.Board(fen, chess960="960" in sys.argv)
+    board = SearchBoard(chess_board)
+    for move in board.generate_moves():
+        chess_move = board.to_chess_move(move)
+        board.push(move)
+        chess_board.push(chess_move)
+        nodes = perft(board, depth - 1) if depth > 1 else 1
+        expected = chess_perft(chess_board, depth - 1) if depth > 1 else 1
+        chess_board.pop()
+        board.pop()
+        print(f"{chess_move.uci():<6} {nodes:>10} {expected:>10}{'' if nodes == expected else '  <--'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft for the esbelto SearchBoard")
+    parser.add_argument("--depth", type=int, help="depth of every position, instead of its own")
+    parser.add_argument("--divide", metavar="FEN", help="node count of every root move of FEN against python-chess")
+    args = parser.parse_args()
+
+    if args.divide:
+        divide(args.divide, args.depth or 3)
+        return
+
+    total_nodes = 0
+    total_time = 0
+    total_chess_time = 0
+    for name, fen, chess960, depth in POSITIONS:
+        depth = args.depth or depth
+        chess_board = chess.Board(fen, chess960=chess960)
+
+        start = time.perf_counter()
+        expected = chess_perft(chess_board, depth)
+        chess_time = time.perf_counter() - start
+
+        board = SearchBoard(chess_board)
+        start = time.perf_counter()
+        nodes = perft(board, depth)
+        elapsed = time.perf_counter() - start
+
+        error = check_keys(board, chess_board.copy(), min(depth - 1, 2))
+        print(f"{name:<15} depth: {depth} nodes: {nodes:>9} python-chess: {expected:>9} "
+              f"time: {elapsed:.2f}s python-chess: {chess_time:.2f}s")
+        if nodes != expected or error:
+            print(f"FAILED: {error or 'node count differs'}")
+            sys.exit(1)
+        total_nodes += nodes
+        total_time += elapsed
+        total_chess_time += chess_time
+
+    print(f"total nodes: {total_nodes} nps: {int(total_nodes / total_time)} "
+          f"python-chess nps: {int(total_nodes / total_chess_time)}")
+
+
+if __name__ == "__main__":
+    main()
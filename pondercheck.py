@@ -0,0 +1,109 @@
+"""
+Checks the ponder hit and miss handling of esbelto in scripted games.
+
+    python pondercheck.py
+    python pondercheck.py --games 5 --moves 40 --hit-rate 0.5
+"""
+
+import argparse
+import random
+import threading
+import chess
+from chess.engine import Limit
+import strategies
+
+
+def timed(function, timeout, *args):
+    """Runs `function(*args)` in a thread, returns its result or raises TimeoutError if it is still running after `timeout`."""
+    result = []
+    errors = []
+
+    def run():
+        try:
+            result.append(function(*args))
+        except Exception as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"{function.__name__} still running after {timeout}s")
+    if errors:
+        raise errors[0]
+    return result[0]
+
+
+def check_game(rng, args):
+    """Plays one game where the opponent plays the pondered reply with probability hit_rate, returns a list of errors."""
+    engine = strategies.esbelto([], {"Hash": 16}, None, {})
+    board = chess.Board()
+    hits = misses = 0
+    # whether the last reply was the pondered move, counted when the engine searches again
+    pending = None
+    errors = []
+    limit = Limit(white_clock=args.clock, black_clock=args.clock, white_inc=0, black_inc=0)
+    try:
+        for move_number in range(args.moves):
+            if board.is_game_over():
+                break
+            hits += pending is True
+            misses += pending is False
+            result = timed(engine.search, args.clock + args.timeout, board, limit, True)
+            if result.move not in board.legal_moves:
+                errors.append(f"illegal move {result.move} in {board.fen()}")
+                break
+            board.push(result.move)
+            if board.is_game_over():
+                break
+
+            replies = list(board.legal_moves)
+            if result.ponder is not None:
+                if result.ponder not in replies:
+                    errors.append(f"illegal ponder move {result.ponder} in {board.fen()}")
+                    break
+                pending = rng.random() < args.hit_rate or len(replies) == 1
+                reply = result.ponder if pending else rng.choice([move for move in replies if move != result.ponder])
+            else:
+                pending = None
+                reply = rng.choice(replies)
+            board.push(reply)
+    except TimeoutError as error:
+        errors.append(f"{error} in {board.fen()}")
+    finally:
+        try:
+            timed(engine.quit, args.timeout)
+        except TimeoutError as error:
+            errors.append(str(error))
+
+    if engine.ponderhits != hits or engine.pondermisses != misses:
+        errors.append(f"engine counted {engine.ponderhits} hits and {engine.pondermisses} misses, "
+                      f"the game had {hits} and {misses}")
+    print(f"moves: {board.fullmove_number} ponder hits: {hits} misses: {misses} "
+          f"time saved: {engine.pondersaved:.1f}s errors: {len(errors)}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check pondering of esbelto in scripted games")
+    parser.add_argument("--games", type=int, default=2, help="Games to play.")
+    parser.add_argument("--moves", type=int, default=30, help="Moves of the engine in every game.")
+    parser.add_argument("--hit-rate", type=float, default=0.7, help="How often the opponent plays the pondered reply.")
+    parser.add_argument("--clock", type=float, default=20, help="Seconds on the clock of every search, without increment.")
+    parser.add_argument("--timeout", type=float, default=10,
+                        help="Seconds beyond the clock after which a search or quit counts as stuck.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the opponent.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    errors = []
+    for game in range(args.games):
+        errors += check_game(rng, args)
+    for error in errors[:10]:
+        print(f"    {error}")
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
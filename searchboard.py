@@ -0,0 +1,480 @@
+"""
+The compact board esbelto searches on, with int moves and incrementally updated keys and evaluation sums.
+"""
+
+import chess
+import chess.polyglot
+from attacks import bishop_attacks, rook_attacks
+
+ZOBRIST = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+
+# PIECE_KEYS[color][piece_type][square], piece types indexed from 1 like python-chess
+PIECE_KEYS = [[[0] * 64] + [[ZOBRIST[64 * ((piece_type - 1) * 2 + color) + square] for square in chess.SQUARES]
+                            for piece_type in chess.PIECE_TYPES]
+              for color in (chess.BLACK, chess.WHITE)]
+
+# (back rank, kingside key, queenside key) of white and black
+CASTLING_KEYS = [(chess.BB_RANK_1, ZOBRIST[768], ZOBRIST[769]), (chess.BB_RANK_8, ZOBRIST[770], ZOBRIST[771])]
+EP_KEYS = ZOBRIST[772:780]
+TURN_KEY = ZOBRIST[780]
+
+EMPTY_PSQT = [[[0] * 64 for piece_type in range(7)] for color in chess.COLORS]
+
+BB_SQUARES = chess.BB_SQUARES
+PROMOTIONS = (chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT)
+
+
+def castling_key(rights, kings, white):
+    """The castling part of the key for the castling rooks `rights`, `kings` and the white pieces `white`."""
+    key = 0
+    for (backrank, kingside, queenside), own in zip(CASTLING_KEYS, (white, ~white)):
+        rooks = rights & backrank
+        king = kings & own & backrank
+        if rooks and king:
+            if rooks & ~((king << 1) - 1):
+                key ^= kingside
+            if rooks & (king - 1):
+                key ^= queenside
+    return key
+
+
+class SearchBoard:
+    """
+    A position with an incrementally updated Zobrist key and evaluation sums.
+
+    The bitboards are plain ints in __slots__ and push/pop save and restore a
+    tuple of ints. Moves are `from_square | to_square << 6 | promotion << 12`,
+    the encoding of the transposition table, and 0 is the null move. Castling
+    is the king capturing its own rook, as python-chess does in Chess960.
+
+    `key` always equals `chess.polyglot.zobrist_hash` of the same position.
+    The keys of earlier positions stay on `stack`, repetition() scans them
+    back to the last capture or pawn move.
+    `pawnkey` is the part of the key that comes from the pawns.
+    `psqtscore` is the sum of `psqt[color][piece_type][square]` over all pieces
+    but the kings, `kingscore` the same sum over the two kings.
+    `castling_rights` holds the squares of the rooks that may still castle.
+    Use `SearchBoard.from_board(board, psqt)` to get a search copy of a board.
+    """
+    __slots__ = ("pawns", "knights", "bishops", "rooks", "queens", "kings", "occupied_co", "occupied",
+                 "turn", "castling_rights", "ep_square", "halfmove_clock", "fullmove_number", "chess960",
+                 "key", "pawnkey", "psqtscore", "kingscore", "psqt", "stack", "rootply")
+
+    def __init__(self, board=None, psqt=EMPTY_PSQT):
+        board = board or chess.Board()
+        self.pawns = board.pawns
+        self.knights = board.knights
+        self.bishops = board.bishops
+        self.rooks = board.rooks
+        self.queens = board.queens
+        self.kings = board.kings
+        self.occupied_co = [board.occupied_co[chess.BLACK], board.occupied_co[chess.WHITE]]
+        self.occupied = board.occupied
+        self.turn = board.turn
+        self.castling_rights = board.clean_castling_rights()
+        self.ep_square = board.ep_square
+        self.halfmove_clock = board.halfmove_clock
+        self.fullmove_number = board.fullmove_number
+        self.chess960 = board.chess960
+        self.psqt = psqt
+        # (key, move, bitboards, castling, en passant, clocks, pawnkey, sums) before every pushed move
+        self.stack = []
+        # length of `stack` at the position the search starts from
+        self.rootply = 0
+        self.refresh()
+
+    @classmethod
+    def from_board(cls, board, psqt=EMPTY_PSQT):
+        # The reversible moves since the last capture or pawn move are
+        # replayed, so that the positions they passed through are on the
+        # key stack for repetition detection.
+        plies = min(board.halfmove_clock, len(board.move_stack))
+        replay = board.move_stack[len(board.move_stack) - plies:]
+        board = board.copy(stack=plies)
+        for move in replay:
+            board.pop()
+
+        search_board = cls(board, psqt)
+        for move in replay:
+            search_board.push(search_board.from_chess_move(move))
+        search_board.rootply = len(search_board.stack)
+        return search_board
+
+    def from_chess_move(self, move):
+        """The int encoding of the chess.Move `move` in this position."""
+        from_square, to_square = move.from_square, move.to_square
+        if (not self.chess960 and self.kings & BB_SQUARES[from_square]
+                and abs(to_square - from_square) == 2 and from_square in (chess.E1, chess.E8)):
+            # standard castling is sent as e1g1, it is the king taking the h1 rook here
+            to_square = to_square + 1 if to_square > from_square else to_square - 2
+        return from_square | to_square << 6 | (move.promotion or 0) << 12
+
+    def to_chess_move(self, move):
+        """The chess.Move of the int `move` in this position, castling as python-chess writes it."""
+        if not move:
+            return chess.Move.null()
+        from_square, to_square = move & 63, move >> 6 & 63
+        if not self.chess960 and self.kings & BB_SQUARES[from_square] and self.occupied_co[self.turn] & BB_SQUARES[to_square]:
+            to_square = to_square - 1 if to_square > from_square else to_square + 2
+        return chess.Move(from_square, to_square, move >> 12 or None)
+
+    def uci(self, move):
+        return self.to_chess_move(move).uci()
+
+    def to_board(self):
+        """The position as a chess.Board, without the moves that led to it."""
+        board = chess.Board(None, chess960=self.chess960)
+        board.pawns, board.knights, board.bishops = self.pawns, self.knights, self.bishops
+        board.rooks, board.queens, board.kings = self.rooks, self.queens, self.kings
+        board.occupied_co = list(self.occupied_co)
+        board.occupied = self.occupied
+        board.turn = self.turn
+        board.castling_rights = self.castling_rights
+        board.ep_square = self.ep_square
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        return board
+
+    def piece_type_at(self, square):
+        """The piece type on `square`, or None."""
+        bb = BB_SQUARES[square]
+        if not self.occupied & bb:
+            return None
+        if self.pawns & bb:
+            return chess.PAWN
+        if self.knights & bb:
+            return chess.KNIGHT
+        if self.bishops & bb:
+            return chess.BISHOP
+        if self.rooks & bb:
+            return chess.ROOK
+        if self.queens & bb:
+            return chess.QUEEN
+        return chess.KING
+
+    def peek(self):
+        """The last move pushed."""
+        return self.stack[-1][1]
+
+    def is_capture(self, move):
+        return bool(BB_SQUARES[move >> 6 & 63] & self.occupied_co[not self.turn]) or self.is_en_passant(move)
+
+    def is_en_passant(self, move):
+        to_square = move >> 6 & 63
+        return (to_square == self.ep_square and (to_square ^ move) & 7 != 0
+                and bool(self.pawns & BB_SQUARES[move & 63]))
+
+    def attackers(self, color, square, occupied):
+        """The pieces of `color` in `occupied` that attack `square` through `occupied`."""
+        return ((chess.BB_PAWN_ATTACKS[not color][square] & self.pawns)
+                | (chess.BB_KNIGHT_ATTACKS[square] & self.knights)
+                | (chess.BB_KING_ATTACKS[square] & self.kings)
+                | (bishop_attacks(square, occupied) & (self.bishops | self.queens))
+                | (rook_attacks(square, occupied) & (self.rooks | self.queens))) & self.occupied_co[color] & occupied
+
+    def is_check(self):
+        king = self.kings & self.occupied_co[self.turn]
+        return bool(self.attackers(not self.turn, king.bit_length() - 1, self.occupied))
+
+    def is_legal(self, move):
+        from_bb = BB_SQUARES[move & 63]
+        if not move or not from_bb & self.occupied_co[self.turn]:
+            return False
+        return move in self.generate_moves(from_bb)
+
+    def generate_moves(self, from_mask=chess.BB_ALL, captures=True, quiets=True, promotions=False):
+        """
+        The legal moves of the pieces on `from_mask`.
+
+        `captures` are the moves onto an enemy piece and en passant, `quiets`
+        all other moves. With `promotions` the quiet promotions are generated
+        even without `quiets`.
+        """
+        us = self.turn
+        them = not us
+        own = self.occupied_co[us]
+        enemy = self.occupied_co[them]
+        occupied = self.occupied
+        empty = ~occupied & chess.BB_ALL
+        king = self.kings & own
+        king_square = king.bit_length() - 1
+        checkers = self.attackers(them, king_square, occupied)
+
+        targets = (enemy if captures else 0) | (empty if quiets else 0)
+        pushes = empty if quiets else (empty & chess.BB_BACKRANKS if promotions else 0)
+        moves = []
+
+        if king & from_mask:
+            squares = chess.BB_KING_ATTACKS[king_square] & targets
+            while squares:
+                to_square = squares.bit_length() - 1
+                if not self.attackers(them, to_square, occupied ^ king):
+                    moves.append(king_square | to_square << 6)
+                squares ^= BB_SQUARES[to_square]
+
+        if checkers & (checkers - 1):
+            # double check, only the king can move
+            return moves
+
+        if checkers:
+            # single check: capture the checker or block
+            evasions = chess.between(king_square, checkers.bit_length() - 1) | checkers
+            targets &= evasions
+            pushes &= evasions
+        elif quiets and self.castling_rights & own and king & from_mask:
+            self.generate_castling(moves, king_square)
+
+        pinned = 0
+        snipers = ((rook_attacks(king_square, 0) & (self.rooks | self.queens))
+                   | (bishop_attacks(king_square, 0) & (self.bishops | self.queens))) & enemy
+        while snipers:
+            sniper = snipers.bit_length() - 1
+            blockers = chess.between(king_square, sniper) & occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers & own
+            snipers ^= BB_SQUARES[sniper]
+
+        pieces = (self.knights | self.bishops | self.rooks | self.queens) & own & from_mask
+        while pieces:
+            from_square = pieces.bit_length() - 1
+            from_bb = BB_SQUARES[from_square]
+            if self.knights & from_bb:
+                squares = chess.BB_KNIGHT_ATTACKS[from_square]
+            elif self.bishops & from_bb:
+                squares = bishop_attacks(from_square, occupied)
+            elif self.rooks & from_bb:
+                squares = rook_attacks(from_square, occupied)
+            else:
+                squares = bishop_attacks(from_square, occupied) | rook_attacks(from_square, occupied)
+            squares &= targets
+            if pinned & from_bb:
+                squares &= chess.ray(king_square, from_square)
+            while squares:
+                to_square = squares.bit_length() - 1
+                moves.append(from_square | to_square << 6)
+                squares ^= BB_SQUARES[to_square]
+            pieces ^= from_bb
+
+        pawns = self.pawns & own & from_mask
+        forward = 8 if us else -8
+        double_rank = chess.BB_RANK_3 if us else chess.BB_RANK_6
+        while pawns:
+            from_square = pawns.bit_length() - 1
+            from_bb = BB_SQUARES[from_square]
+            squares = chess.BB_PAWN_ATTACKS[us][from_square] & enemy & targets
+            single = BB_SQUARES[from_square + forward]
+            if single & empty:
+                squares |= single & pushes
+                if single & double_rank:
+                    squares |= BB_SQUARES[from_square + 2 * forward] & empty & pushes
+            if pinned & from_bb:
+                squares &= chess.ray(king_square, from_square)
+            while squares:
+                to_square = squares.bit_length() - 1
+                if BB_SQUARES[to_square] & chess.BB_BACKRANKS:
+                    for promotion in PROMOTIONS:
+                        moves.append(from_square | to_square << 6 | promotion << 12)
+                else:
+                    moves.append(from_square | to_square << 6)
+                squares ^= BB_SQUARES[to_square]
+            pawns ^= from_bb
+
+        if captures and self.ep_square is not None:
+            self.generate_en_passant(moves, from_mask, king_square)
+
+        return moves
+
+    def generate_castling(self, moves, king_square):
+        us = self.turn
+        king = BB_SQUARES[king_square]
+        backrank = 0 if us else 56
+        for rook_square in chess.scan_reversed(self.castling_rights & self.occupied_co[us] & self.rooks
+                                               & (chess.BB_RANK_1 if us else chess.BB_RANK_8)):
+            rook = BB_SQUARES[rook_square]
+            if rook_square < king_square:
+                king_to, rook_to = backrank + 2, backrank + 3
+            else:
+                king_to, rook_to = backrank + 6, backrank + 5
+            king_path = chess.between(king_square, king_to)
+            rook_path = chess.between(rook_square, rook_to)
+            if (self.occupied ^ king ^ rook) & (king_path | rook_path | BB_SQUARES[king_to] | BB_SQUARES[rook_to]):
+                continue
+            occupied = self.occupied ^ king
+            if any(self.attackers(not us, square, occupied) for square in chess.scan_forward(king_path | king)):
+                continue
+            if self.attackers(not us, king_to, occupied ^ rook ^ BB_SQUARES[rook_to]):
+                continue
+            moves.append(king_square | rook_square << 6)
+
+    def generate_en_passant(self, moves, from_mask, king_square):
+        # pins through the two pawns that leave the rank are rare, the king is checked with the board after the capture
+        us = self.turn
+        ep_square = self.ep_square
+        captured = BB_SQUARES[ep_square - 8 if us else ep_square + 8]
+        if not captured & self.pawns & self.occupied_co[not us]:
+            return
+        for from_square in chess.scan_reversed(chess.BB_PAWN_ATTACKS[not us][ep_square] & self.pawns
+                                               & self.occupied_co[us] & from_mask):
+            occupied = (self.occupied ^ BB_SQUARES[from_square] ^ captured) | BB_SQUARES[ep_square]
+            if not self.attackers(not us, king_square, occupied):
+                moves.append(from_square | ep_square << 6)
+
+    def push(self, move):
+        us = self.turn
+        them = not us
+        occupied_co = self.occupied_co
+        self.stack.append((self.key, move, self.pawns, self.knights, self.bishops, self.rooks, self.queens, self.kings,
+                           occupied_co[chess.BLACK], occupied_co[chess.WHITE], self.castling_rights, self.ep_square,
+                           self.halfmove_clock, self.fullmove_number, self.pawnkey, self.psqtscore, self.kingscore))
+
+        key = self.key ^ TURN_KEY
+        if self.ep_square is not None:
+            key ^= self.epkey()
+        ep_square = self.ep_square
+        self.ep_square = None
+        self.halfmove_clock += 1
+        if us == chess.BLACK:
+            self.fullmove_number += 1
+        self.turn = them
+
+        if move:
+            from_square = move & 63
+            to_square = move >> 6 & 63
+            promotion = move >> 12
+            from_bb = BB_SQUARES[from_square]
+            to_bb = BB_SQUARES[to_square]
+            pieces = [0, self.pawns, self.knights, self.bishops, self.rooks, self.queens, self.kings]
+            kings = self.kings
+            white = occupied_co[chess.WHITE]
+            for piece in chess.PIECE_TYPES:
+                if pieces[piece] & from_bb:
+                    break
+            own_keys = PIECE_KEYS[us]
+            own_psqt = self.psqt[us]
+
+            if piece == chess.KING and to_bb & occupied_co[us]:
+                # castling, the king takes its own rook
+                backrank = 0 if us else 56
+                if to_square > from_square:
+                    king_to, rook_to = backrank + 6, backrank + 5
+                else:
+                    king_to, rook_to = backrank + 2, backrank + 3
+                pieces[chess.KING] = pieces[chess.KING] & ~from_bb | BB_SQUARES[king_to]
+                pieces[chess.ROOK] = pieces[chess.ROOK] & ~to_bb | BB_SQUARES[rook_to]
+                occupied_co[us] = occupied_co[us] & ~(from_bb | to_bb) | BB_SQUARES[king_to] | BB_SQUARES[rook_to]
+                key ^= (own_keys[chess.KING][from_square] ^ own_keys[chess.KING][king_to]
+                        ^ own_keys[chess.ROOK][to_square] ^ own_keys[chess.ROOK][rook_to])
+                self.kingscore += own_psqt[chess.KING][king_to] - own_psqt[chess.KING][from_square]
+                self.psqtscore += own_psqt[chess.ROOK][rook_to] - own_psqt[chess.ROOK][to_square]
+            else:
+                captured_square = to_square
+                captured = 0
+                if to_bb & occupied_co[them]:
+                    for captured in chess.PIECE_TYPES:
+                        if pieces[captured] & to_bb:
+                            break
+                elif piece == chess.PAWN and to_square == ep_square:
+                    captured = chess.PAWN
+                    captured_square = to_square - 8 if us else to_square + 8
+                if captured:
+                    captured_bb = BB_SQUARES[captured_square]
+                    pieces[captured] ^= captured_bb
+                    occupied_co[them] ^= captured_bb
+                    key ^= PIECE_KEYS[them][captured][captured_square]
+                    self.psqtscore -= self.psqt[them][captured][captured_square]
+                    if captured == chess.PAWN:
+                        self.pawnkey ^= PIECE_KEYS[them][chess.PAWN][captured_square]
+                    self.halfmove_clock = 0
+
+                placed = promotion or piece
+                pieces[piece] ^= from_bb
+                pieces[placed] |= to_bb
+                occupied_co[us] ^= from_bb | to_bb
+                key ^= own_keys[piece][from_square] ^ own_keys[placed][to_square]
+                if piece == chess.KING:
+                    self.kingscore += own_psqt[chess.KING][to_square] - own_psqt[chess.KING][from_square]
+                else:
+                    self.psqtscore += own_psqt[placed][to_square] - own_psqt[piece][from_square]
+                if piece == chess.PAWN:
+                    self.halfmove_clock = 0
+                    self.pawnkey ^= own_keys[chess.PAWN][from_square]
+                    if not promotion:
+                        self.pawnkey ^= own_keys[chess.PAWN][to_square]
+                    if to_square - from_square in (16, -16):
+                        self.ep_square = (from_square + to_square) // 2
+
+            (_, self.pawns, self.knights, self.bishops, self.rooks, self.queens, self.kings) = pieces
+            self.occupied = occupied_co[chess.WHITE] | occupied_co[chess.BLACK]
+
+            rights = self.castling_rights
+            if rights:
+                touched = from_bb | to_bb
+                if piece == chess.KING:
+                    touched |= chess.BB_RANK_1 if us else chess.BB_RANK_8
+                if rights & touched:
+                    self.castling_rights = rights & ~touched
+                    key ^= (castling_key(rights, kings, white)
+                            ^ castling_key(self.castling_rights, self.kings, occupied_co[chess.WHITE]))
+
+            if self.ep_square is not None:
+                key ^= self.epkey()
+
+        self.key = key
+
+    def pop(self):
+        occupied_co = self.occupied_co
+        (self.key, move, self.pawns, self.knights, self.bishops, self.rooks, self.queens, self.kings,
+         occupied_co[chess.BLACK], occupied_co[chess.WHITE], self.castling_rights, self.ep_square,
+         self.halfmove_clock, self.fullmove_number, self.pawnkey, self.psqtscore, self.kingscore) = self.stack.pop()
+        self.occupied = occupied_co[chess.WHITE] | occupied_co[chess.BLACK]
+        self.turn = not self.turn
+        return move
+
+    def repetition(self):
+        """
+        True if the position is a repetition since the last capture or pawn move.
+
+        One earlier occurrence after the search root is enough, positions from
+        before the root must have occurred twice, as in a threefold repetition.
+        """
+        key = self.key
+        stack = self.stack
+        last = len(stack) - min(self.halfmove_clock, len(stack))
+        seen = 0
+        for index in range(len(stack) - 4, last - 1, -2):
+            if stack[index][0] == key:
+                if index >= self.rootply:
+                    return True
+                seen += 1
+                if seen == 2:
+                    return True
+        return False
+
+    def epkey(self):
+        """The en passant part of the key, polyglot only counts an en passant square the side to move can capture on."""
+        if chess.BB_PAWN_ATTACKS[not self.turn][self.ep_square] & self.pawns & self.occupied_co[self.turn]:
+            return EP_KEYS[self.ep_square & 7]
+        return 0
+
+    def refresh(self):
+        """Recomputes the keys and sums from scratch."""
+        key = castling_key(self.castling_rights, self.kings, self.occupied_co[chess.WHITE])
+        if self.turn == chess.WHITE:
+            key ^= TURN_KEY
+        if self.ep_square is not None:
+            key ^= self.epkey()
+        self.pawnkey = 0
+        self.psqtscore = 0
+        self.kingscore = 0
+        for color in chess.COLORS:
+            for piece_type, pieces in zip(chess.PIECE_TYPES, (self.pawns, self.knights, self.bishops,
+                                                              self.rooks, self.queens, self.kings)):
+                for square in chess.scan_forward(pieces & self.occupied_co[color]):
+                    key ^= PIECE_KEYS[color][piece_type][square]
+                    if piece_type == chess.KING:
+                        self.kingscore += self.psqt[color][chess.KING][square]
+                    else:
+                        self.psqtscore += self.psqt[color][piece_type][square]
+                    if piece_type == chess.PAWN:
+                        self.pawnkey ^= PIECE_KEYS[color][chess.PAWN][square]
+        self.key = key
@@ -0,0 +1,132 @@
+"""
+Persistent cache of root search results for esbelto, in a memory-mapped file shared by all games.
+"""
+
+import mmap
+import os
+import tempfile
+import time
+from transposition import DEPTH_SHIFT, BOUND_SHIFT, SCORE_SHIFT, WORD_MASK
+
+MAGIC = b"ESBCACHE"
+HEADER_SIZE = 16  # the magic and the number of buckets
+ENTRY_SIZE = 24  # bytes, the key, data and last use words
+BUCKET_SLOTS = 4
+
+# positions later in the game rarely come up again
+MAX_FULLMOVE = 20
+
+
+def attach(path, size, header):
+    """Maps the file `path` if it has the size and header of the cache, returns None otherwise."""
+    try:
+        file = open(path, "r+b")
+    except FileNotFoundError:
+        return None
+    with file:
+        if os.fstat(file.fileno()).st_size != size or file.read(HEADER_SIZE) != header:
+            return None
+        return mmap.mmap(file.fileno(), size)
+
+
+def create(path, size, header):
+    """Builds an empty cache under a temporary name, moves it over `path` and returns its mapping."""
+    # other games may have the old file mapped, truncating it would kill them with SIGBUS
+    directory, name = os.path.split(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(prefix=name + ".", dir=directory)
+    try:
+        with os.fdopen(descriptor, "r+b") as file:
+            os.fchmod(file.fileno(), 0o644)
+            file.truncate(size)
+            file.write(header)
+            file.flush()
+            result = mmap.mmap(file.fileno(), size)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return result
+
+
+class SearchCache:
+    """
+    A cache of `megabytes` size in the file `path`, rounded down to a power of two buckets.
+
+    A file of another size or format is replaced by a new one, never resized in
+    place. A new position takes the slot of the least recently used entry of
+    its bucket. Games write without locks, like in the shared TranspositionTable.
+    """
+    def __init__(self, path, megabytes):
+        buckets = max(1, int(megabytes * 1024 * 1024) // (BUCKET_SLOTS * ENTRY_SIZE))
+        buckets = 1 << (buckets.bit_length() - 1)
+        self.mask = buckets - 1
+        size = HEADER_SIZE + buckets * BUCKET_SLOTS * ENTRY_SIZE
+        header = MAGIC + buckets.to_bytes(8, "little")
+
+        self.mmap = attach(path, size, header)
+        if self.mmap is None:
+            self.mmap = create(path, size, header)
+        self.words = memoryview(self.mmap)[HEADER_SIZE:].cast("Q")
+        # data words of the results of this game and the keys it looked up, for save()
+        self.pending = {}
+        self.used = set()
+
+    def close(self):
+        self.words.release()
+        self.mmap.close()
+
+    def find(self, key):
+        """The first word of the entry of `key`, or None."""
+        first = (key & self.mask) * BUCKET_SLOTS * 3
+        for index in range(first, first + BUCKET_SLOTS * 3, 3):
+            if self.words[index] ^ self.words[index + 1] == key:
+                return index
+        return None
+
+    def probe(self, key):
+        """Returns (score, depth, move, bound) for `key`, or None if it is not in the cache."""
+        data = self.pending.get(key)
+        if data is None:
+            index = self.find(key)
+            if index is None:
+                return None
+            data = self.words[index + 1]
+            self.used.add(key)
+        score = data >> SCORE_SHIFT
+        if score >= 1 << 31:
+            score -= 1 << 32
+        return score, data >> DEPTH_SHIFT & 0xFF, data & 0xFFFF, data >> BOUND_SHIFT & 0x3
+
+    def store(self, key, score, depth, move, bound):
+        """Keeps a result until save(), the deepest result of a position wins."""
+        data = ((int(score) << SCORE_SHIFT) & WORD_MASK | bound << BOUND_SHIFT
+                | min(depth, 0xFF) << DEPTH_SHIFT | move)
+        old = self.pending.get(key)
+        if old is None or depth >= (old >> DEPTH_SHIFT & 0xFF):
+            self.pending[key] = data
+
+    def save(self):
+        """Writes the results of this game and marks the entries it used as recently used."""
+        now = int(time.time())
+        for key in self.used - self.pending.keys():
+            index = self.find(key)
+            if index is not None:
+                self.words[index + 2] = now
+        for key, data in self.pending.items():
+            self.write(key, data, now)
+        self.mmap.flush()
+        self.pending = {}
+        self.used = set()
+
+    def write(self, key, data, now):
+        index = self.find(key)
+        if index is not None and (data >> DEPTH_SHIFT & 0xFF) < (self.words[index + 1] >> DEPTH_SHIFT & 0xFF):
+            # a deeper result is already cached
+            self.words[index + 2] = now
+            return
+        if index is None:
+            first = (key & self.mask) * BUCKET_SLOTS * 3
+            index = min(range(first, first + BUCKET_SLOTS * 3, 3), key=lambda slot: self.words[slot + 2])
+        self.words[index] = key ^ data
+        self.words[index + 1] = data
+        self.words[index + 2] = now
@@ -0,0 +1,53 @@
+"""
+Checks that games opening the search cache file with different sizes do not crash the games that have it mapped.
+
+    python searchcachecheck.py
+    python searchcachecheck.py --processes 8 --rounds 200
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+from searchcache import SearchCache
+
+
+def run(path, rounds, seed):
+    """Opens the cache `rounds` times with a random size and fills it, like a game that stores its results."""
+    rng = random.Random(seed)
+    for game in range(rounds):
+        cache = SearchCache(path, rng.choice([0.25, 0.5, 1]))
+        for position in range(200):
+            key = rng.getrandbits(64)
+            cache.store(key, rng.randrange(-1000, 1000), rng.randrange(1, 20), rng.randrange(1, 4096), 0)
+            cache.probe(key)
+            cache.save()
+        cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the search cache file under concurrent games")
+    parser.add_argument("--processes", type=int, default=4, help="Concurrent games on the cache file.")
+    parser.add_argument("--rounds", type=int, default=50, help="Games played by every process.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "search.cache")
+        processes = [multiprocessing.Process(target=run, args=(path, args.rounds, seed))
+                     for seed in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        leftovers = sorted(set(os.listdir(directory)) - {"search.cache"})
+
+    failed = [process.exitcode for process in processes if process.exitcode]
+    print(f"processes: {args.processes} games: {args.processes * args.rounds} "
+          f"failed: {len(failed)} exit codes: {failed} leftover files: {leftovers}")
+    if failed or leftovers:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
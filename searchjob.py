@@ -0,0 +1,27 @@
+"""
+A single run of the esbelto search, with its own board, clock, thread and cancel Event.
+"""
+
+from threading import Event, Thread
+
+
+class SearchJob:
+    """Runs `target(board)` in a thread, `board` is not shared with anything else."""
+    def __init__(self, target, board, clock):
+        self.board = board
+        self.clock = clock
+        self.stop = Event()
+        self.thread = Thread(target=target, args=(board,), daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        """Asks the search to stop, it returns from the next node it visits."""
+        self.stop.set()
+
+    def cancelled(self):
+        return self.stop.is_set()
+
+    def join(self):
+        self.thread.join()
@@ -0,0 +1,75 @@
+"""
+Checks that the transposition table shared by concurrent games keeps turning over.
+
+    python sharedhashcheck.py
+    python sharedhashcheck.py --games 8 --moves 60 --hash 0.1
+"""
+
+import argparse
+import random
+import chess
+from chess.engine import Limit
+import strategies
+from transposition import TranspositionTable, GENERATION
+
+
+def held_share(table, snapshot):
+    """Share of the used depth-preferred slots that still hold the entry they held in `snapshot`."""
+    used = held = 0
+    for index in range(0, len(table.data), 2):
+        if table.keys[index]:
+            used += 1
+            if (table.keys[index], table.data[index]) == snapshot[index // 2]:
+                held += 1
+    return held / max(used, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the replacement of the shared transposition table")
+    parser.add_argument("--games", type=int, default=4, help="Concurrent games on the table.")
+    parser.add_argument("--moves", type=int, default=40, help="Moves searched by every game.")
+    parser.add_argument("--length", type=int, default=10, help="Moves after which a game is over and a new one starts.")
+    parser.add_argument("--depth", type=int, default=3, help="Depth of every search.")
+    parser.add_argument("--hash", type=float, default=0.03, help="Megabytes of the shared table.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the openings.")
+    parser.add_argument("--max-held", type=float, default=0.05,
+                        help="Fail when a larger share of the depth-preferred slots outlives the second half of the run.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    table = TranspositionTable(args.hash, shared=True, window=2 * args.games)
+    engines = [strategies.esbelto([], {"SharedHash": args.hash, "SharedHashName": table.name}, None, {})
+               for game in range(args.games)]
+    boards = [chess.Board() for game in range(args.games)]
+    finished = 0
+    hashfull = []
+    snapshot = None
+    for move in range(args.moves):
+        if move == args.moves // 2:
+            snapshot = [(table.keys[index], table.data[index]) for index in range(0, len(table.data), 2)]
+        for game, engine in enumerate(engines):
+            board = boards[game]
+            if board.is_game_over() or board.ply() >= 4 + 2 * args.length:
+                finished += 1
+                board = boards[game] = chess.Board()
+            if board.ply() < 4:
+                # a few random opening moves, so the games do not all search the same positions
+                board.push(rng.choice(list(board.legal_moves)))
+                continue
+            board.push(engine.search(board, Limit(depth=args.depth), False, False).move)
+        hashfull.append(table.hashfull())
+
+    share = held_share(table, snapshot)
+    print(f"games: {args.games} moves: {args.moves} finished games: {finished} generation: {table.header[GENERATION]} "
+          f"window: {table.window}")
+    print(f"hashfull every 10 moves: {' '.join(str(full) for full in hashfull[9::10])}")
+    print(f"depth-preferred slots held since move {args.moves // 2}: {share:.1%}")
+    for engine in engines:
+        engine.quit()
+    table.close()
+    if share > args.max_held or hashfull[-1] >= 1000:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
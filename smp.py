@@ -0,0 +1,125 @@
+"""
+Lazy SMP helpers for the esbelto search: helper processes that share the transposition table with the main search.
+
+    python smp.py <shared table name> <hash megabytes> <options as JSON>
+"""
+
+import json
+import os
+import subprocess
+import sys
+from functools import partial
+from threading import Thread
+import chess
+from chess.engine import Limit
+
+
+class SearchHelpers:
+    """
+    `count` helper processes attached to the shared transposition table `transposition`.
+
+    Jobs and results are single JSON lines on the stdin and stdout of every helper.
+    """
+    def __init__(self, count, transposition, megabytes, options):
+        command = [sys.executable, os.path.abspath(__file__), transposition.name, str(megabytes), json.dumps(options)]
+        self.processes = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+                                           cwd=os.path.dirname(os.path.abspath(__file__)))
+                          for helper in range(count)]
+        # wait until every helper has imported the engine and attached to the table
+        for process in self.processes:
+            process.stdout.readline()
+        self.readers = []
+        self.results = []
+
+    def start(self, game, engine):
+        """Sends the position `game` to every helper, a helper that completes the search cancels the job of `engine`."""
+        root = game.root()
+        for helper, process in enumerate(self.processes, 1):
+            job = {"fen": root.fen(), "chess960": game.chess960, "moves": [move.uci() for move in game.move_stack],
+                   "helper": helper, "maxdepth": engine.depthlimit, "age": engine.transposition.age}
+            process.stdin.write(json.dumps(job) + "\n")
+        self.results = []
+        self.readers = [Thread(target=self.read, args=(process, engine), daemon=True) for process in self.processes]
+        for reader in self.readers:
+            reader.start()
+
+    def read(self, process, engine):
+        line = process.stdout.readline()
+        if not line:
+            return
+        result = json.loads(line)
+        self.results.append(result)
+        if result["finished"]:
+            engine.job.cancel()
+
+    def stop(self):
+        """Stops the helpers and returns their results, the deepest completed iteration first."""
+        for process in self.processes:
+            if process.poll() is None:
+                process.stdin.write("stop\n")
+        for reader in self.readers:
+            reader.join()
+        self.readers = []
+        return sorted(self.results, key=lambda result: result["depth"], reverse=True)
+
+    def close(self):
+        for process in self.processes:
+            if process.poll() is None:
+                process.stdin.close()
+                process.wait()
+
+
+def run(engine, out, board):
+    engine.iterativedeepening(board)
+
+    depth, move, score = engine.completed
+    result = {"depth": depth, "move": board.uci(move or engine.move), "score": score, "nodes": engine.nodes,
+              "resigned": engine.resigned, "finished": not engine.job.cancelled()}
+    out.write(json.dumps(result) + "\n")
+    out.flush()
+
+
+def main():
+    import strategies
+    from searchboard import SearchBoard
+    from searchjob import SearchJob
+    from timecontrol import SearchClock
+    from transposition import TranspositionTable
+
+    name, megabytes, options = sys.argv[1], float(sys.argv[2]), json.loads(sys.argv[3])
+    # keep stdout for the results, nothing else may write to it
+    out = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+
+    engine = strategies.esbelto([], {**options, "Hash": 0, "Threads": 1, "SearchCache": None, "SharedHashName": None}, None, {})
+    engine.transposition = TranspositionTable(megabytes, name=name)
+    out.write("ready\n")
+    out.flush()
+
+    for line in sys.stdin:
+        if line.strip() == "stop":
+            engine.job.cancel()
+            continue
+        if engine.job is not None:
+            engine.job.join()
+
+        job = json.loads(line)
+        board = chess.Board(job["fen"], chess960=job["chess960"])
+        for move in job["moves"]:
+            board.push_uci(move)
+        engine.newsearch(board)
+        engine.transposition.age = job["age"]
+        engine.depthlimit = job["maxdepth"]
+        engine.helper = job["helper"]
+        engine.job = SearchJob(partial(run, engine, out), SearchBoard.from_board(board, engine.psqt),
+                               SearchClock(Limit(), board.turn, board.fullmove_number))
+        engine.job.start()
+
+    if engine.job is not None:
+        engine.job.cancel()
+        engine.job.join()
+    engine.transposition.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Checks the Lazy SMP search of esbelto: legal moves, helpers that keep up and a clean shutdown.
+
+    python smpcheck.py
+    python smpcheck.py --threads 4 --moves 20
+"""
+
+import argparse
+import os
+import chess
+from chess.engine import Limit
+import strategies
+from pondercheck import timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the Lazy SMP search of esbelto")
+    parser.add_argument("--threads", type=int, default=3, help="Threads option of the engine.")
+    parser.add_argument("--moves", type=int, default=12, help="Plies the engine plays against itself.")
+    parser.add_argument("--clock", type=float, default=20, help="Seconds on the clock of every search, without increment.")
+    parser.add_argument("--timeout", type=float, default=10,
+                        help="Seconds beyond the clock after which a search or quit counts as stuck.")
+    args = parser.parse_args()
+
+    engine = strategies.esbelto([], {"Threads": args.threads, "Hash": 16}, None, {})
+    name = engine.transposition.name
+    processes = engine.helpers.processes
+    board = chess.Board()
+    limit = Limit(white_clock=args.clock, black_clock=args.clock, white_inc=0, black_inc=0)
+    errors = []
+    try:
+        for ply in range(args.moves):
+            if board.is_game_over():
+                break
+            result = timed(engine.search, args.clock + args.timeout, board, limit, False)
+            print(f"ply: {ply + 1:>2} move: {result.move.uci()} depth: {result.info.get('depth')} "
+                  f"nodes: {result.info.get('nodes')}")
+            if result.move not in board.legal_moves:
+                errors.append(f"illegal move {result.move} in {board.fen()}")
+                break
+            dead = [process.pid for process in processes if process.poll() is not None]
+            if dead:
+                errors.append(f"helpers {dead} exited during the game")
+                break
+            board.push(result.move)
+    except TimeoutError as error:
+        errors.append(f"{error} in {board.fen()}")
+    finally:
+        try:
+            timed(engine.quit, args.timeout)
+        except TimeoutError as error:
+            errors.append(str(error))
+
+    running = [process.pid for process in processes if process.poll() is None]
+    if running:
+        errors.append(f"helpers {running} still running after quit")
+    if os.path.exists(f"/dev/shm/{name.lstrip('/')}"):
+        errors.append(f"shared memory block {name} left after quit")
+    print(f"threads: {args.threads} plies: {board.ply()} errors: {len(errors)}")
+    for error in errors:
+        print(f"    {error}")
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
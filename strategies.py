@@ -4,10 +4,24 @@ And some handy classes to extend
 """
 
 import chess
-from chess.engine import PlayResult
+from chess.engine import PlayResult, Limit, PovScore, Cp
 from engine_wrapper import EngineWrapper
+from searchboard import SearchBoard
+from transposition import TranspositionTable, EvalTable, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER
+from pawnstructure import PawnHashTable, KING_PROXIMITY, passed_bonus, doubled_penalty
+from evalweights import load_weights
+from attacks import mobility, see, SAME_PARITY, SEE_VALUES
+from movepicker import MoveOrdering
+from smp import SearchHelpers
+from timecontrol import SearchClock, POLL_NODES
+from searchjob import SearchJob
+from searchcache import SearchCache, MAX_FULLMOVE
+from tablebase import Tablebases, wdl_score
+import logging
+import random
 import time
-from threading import Thread
+
+logger = logging.getLogger(__name__)
 
 class FillerEngine:
     """
@@ -82,406 +96,672 @@ class esbelto(MinimalEngine):
     def __init__(self, commands, options, stderr, draw_or_resign, name=None, **popen_args):
         super().__init__(commands, options, stderr, draw_or_resign, name, **popen_args)
 
-        self.transposition = {}
-        self.evaltt = {}
-        self.temptt = {}
-        self.tempeval = {}
-        self.cleanse = False
-
-        self.knightmap = [
-          -10, -10, -10, -10, -10, -10, -10, -10,
-          -10, -10,  -5,   0,   0,  -5,  -5, -10,
-          -10,  -5,  10,   0,   0,  10,  -5, -10,
-           -5,   0,  10,  20,  20,  10,   0,  -5,
-           -5,   0,  10,  20,  20,  10,   0,  -5,
-          -10,  -5,  10,   0,   0,  10,  -5, -10,
-          -10, -10,  -5,   0,   0,  -5, -10, -10,
-          -10, -10, -10, -10, -10, -10, -10, -10 ]
-
-        self.kingmap = [
-              10,  18,  20, -50,   0, -50,  30,  27, 
-              0,  -5,   0, -80,-100, -80,   5,   5, 
-            -10, -20, -50, -50, -50, -50, -20, -10,
-            -5,  -20,  -5, -10, -10,  -5, -20,  -5,
-            -5,    0,   5,  10,  10,   5,   0,  -5,
-             10,  20,  50,  50,  50,  50,  20,  10,
-              0,   5,  10,  80, 100,  80,   0, -10,
-             -10, -18, -20,  50,   0,  50, -30, -27, 
-        ]
-
-        print('init')
+        # Deterministic: one thread, no pondering and no time limits, only Limit.depth and
+        # Limit.nodes stop the search, so the same game always gets the same moves
+        self.deterministic = options.get("Deterministic", False)
+        # Lazy SMP: Threads - 1 helper processes share the transposition table with this one
+        self.threads = 1 if self.deterministic else options.get("Threads", 1)
+        # the table of all concurrent games, created by lichess-bot.py. A deterministic
+        # engine keeps a private table, entries of other games would change its moves.
+        self.sharedhash = bool(options.get("SharedHashName")) and not self.deterministic
+        if self.sharedhash:
+            self.hashsize = options["SharedHash"]
+            self.transposition = TranspositionTable(self.hashsize, name=options["SharedHashName"])
+        else:
+            self.hashsize = options.get("Hash", 16)
+            self.transposition = TranspositionTable(self.hashsize, shared=self.threads > 1)
+        self.evaltt = EvalTable()
+        self.ordering = MoveOrdering()
+        # depth limit when Limit.depth is not given
+        self.maxdepth = 9
+        self.helper = 0
+        # seconds kept in reserve on every move, on top of the move_overhead of lichess-bot
+        self.overhead = options.get("MoveOverhead", 100) / 1000
+
+        # forward pruning, both can be turned off from homemade_options for A/B tests
+        self.nullmove = options.get("NullMove", True)
+        self.nullreduction = options.get("NullMoveReduction", 2)
+        self.lmr = options.get("LateMoveReductions", True)
+        self.lmrmoves = options.get("LateMoveReductionMoves", 3)
+
+        # root results of earlier games in the opening, played without searching when deep enough
+        self.cache = None
+        if options.get("SearchCache") and not self.deterministic:
+            self.cache = SearchCache(options["SearchCache"], options.get("SearchCacheSize", 16))
+        self.cachedepth = options.get("SearchCacheDepth", 6)
+
+        # local Syzygy tables, played from at the root and probed inside the search
+        self.tablebases = None
+        if options.get("SyzygyPath"):
+            self.tablebases = Tablebases(options["SyzygyPath"], options.get("SyzygyProbeLimit", 7))
+
+        # evaluation weights, the defaults or those of a file written by tune.py
+        self.weights = weights = load_weights(options.get("EvalWeights"))
+        self.piecevalues = [0] + weights["piece_values"] + [0]
+        self.knightmap = weights["knightmap"]
+        self.kingmap = weights["kingmap"]
+        self.kingattack = weights["king_attack"]
+        self.kingfile = weights["king_file"]
+        self.kingrank = weights["king_rank"]
+        self.bishopmobility = weights["bishop_mobility"]
+        self.bishoppair = weights["bishop_pair"]
+        self.bishopparity = weights["bishop_pawn_parity"]
+        self.knightmobility = weights["knight_mobility"]
+        self.knightdistance = weights["knight_king_distance"]
+        self.rookmobility = weights["rook_mobility"]
+        self.queenmobility = weights["queen_mobility"]
+        self.kingpawns = weights["king_pawn_proximity"]
+        self.pawntable = PawnHashTable(passed=passed_bonus(weights["passed_pawn"], weights["passed_pawn_rank"]),
+                                       doubled=doubled_penalty(weights["doubled_pawn"]))
+
+        self.psqt = self.psqttables()
+
+        # the running SearchJob, it keeps running on the expected position while pondering
+        self.job = None
+        self.ponderfen = None
+        self.ponderstart = 0
+        self.ponderhits = 0
+        self.pondermisses = 0
+        self.pondersaved = 0
+        self.helpers = None
+        if self.threads > 1:
+            self.helpers = SearchHelpers(self.threads - 1, self.transposition, self.hashsize, options)
+
+        # called from the search thread with the InfoDict of every completed iteration of a move search
+        self.oninfo = None
 
     def search (self, game, maxtime, ponder, *args):
-        self.abort_ponder = True
-        self.abort = False
+        if self.deterministic:
+            maxtime = Limit(depth=maxtime.depth, nodes=maxtime.nodes)
+            ponder = False
+
+        if self.tablebases and self.tablebases.applies(game):
+            probe = self.tablebases.root(game)
+            if probe is not None:
+                move, wdl = probe
+                logger.debug(f'TB => move: {move.uci()}, wdl: {wdl}')
+                self.stopsearch()
+                info = {"score": PovScore(Cp(wdl_score(wdl)), game.turn), "pv": [move], "tbhits": self.tablebases.hits}
+                return self.process_result(game, PlayResult(move, None, info))
+
+        if self.ponderfen is not None and game.fen() == self.ponderfen:
+            # ponder hit: the running search becomes the real one, it only needs a clock
+            saved = time.monotonic() - self.ponderstart
+            self.ponderhits += 1
+            self.pondersaved += saved
+            self.ponderfen = None
+            self.job.clock = SearchClock(maxtime, game.turn, game.fullmove_number, self.overhead)
+            self.depthlimit = maxtime.depth or self.maxdepth
+            logger.debug(f'ponder hit after {saved:.2f}s')
+        else:
+            if self.ponderfen is not None:
+                self.pondermisses += 1
+                logger.debug('ponder miss')
+            self.stopsearch()
+            self.startsearch(SearchBoard.from_board(game, self.psqt), maxtime)
+
+        logger.debug(f'Tempo: {self.job.clock.soft:.2f}s, hard limit: {self.job.clock.hard:.2f}s')
+        if self.helpers:
+            self.helpers.start(game, self)
+        self.job.join()
+
+        if self.helpers:
+            self.collecthelpers()
+
+        depth, cached, score = self.completed
+        if self.cache and self.cacheable and game.fullmove_number <= MAX_FULLMOVE and depth > 0:
+            self.cache.store(self.job.board.key, score, depth, cached, BOUND_EXACT)
+
+        logger.debug(f'beta cutoffs: {self.cutoff}, first move: {self.firstcutoff}')
+
+        if self.move:
+            move = self.job.board.to_chess_move(self.move)
+            if self.completed[0] >= 0:
+                info = self.searchinfo(self.job.board, self.completed[0], self.completed[2], self.move)
+            else:
+                # stopped before the first iteration completed, there is no depth or score to report
+                info = {"pv": [move]}
+        else:
+            logger.debug('no move searched, playing the first legal move')
+            move = list(game.legal_moves)[0]
+            info = {}
+        result = PlayResult(move, None, info, resigned = self.resigned)
+
+        if ponder and self.resigned == False:
+            result.ponder = self.ponder(game, move)
+
+        return self.process_result(game, result)
+
+    def ponder(self, game, move):
+        # starts searching the position after the expected reply, returns that reply or None
+        board = SearchBoard.from_board(game, self.psqt)
+        board.push(board.from_chess_move(move))
+        entry = self.transposition.probe(board.key)
+        if entry is None or not board.is_legal(entry[2]):
+            return None
+        reply = board.to_chess_move(entry[2])
+        expected = game.copy()
+        expected.push(move)
+        expected.push(reply)
+        if expected.is_game_over():
+            return None
+
+        self.ponderfen = expected.fen()
+        self.ponderstart = time.monotonic()
+        self.startsearch(SearchBoard.from_board(expected, self.psqt))
+        return reply
+
+    def startsearch(self, board, limit=None):
+        # runs iterativedeepening on `board` in a new SearchJob, the previous job must have ended
+        limit = limit or Limit()
+        self.newsearch(board)
+        self.depthlimit = limit.depth or self.maxdepth
+        # an explicit depth or node limit asks for a search
+        self.cacheable = limit.depth is None and limit.nodes is None
+        clock = SearchClock(limit, board.turn, board.fullmove_number, self.overhead)
+        self.job = SearchJob(self.iterativedeepening, board, clock)
+        self.job.start()
+
+    def stopsearch(self):
+        # cancels a running ponder search and waits for it
+        if self.job is not None:
+            self.job.cancel()
+            self.job.join()
+            self.job = None
+        self.ponderfen = None
+
+    def newsearch(self, game):
         self.resigned = False
-        self.shouldabort = False
+        self.depthlimit = self.maxdepth
+        self.cacheable = False
+        self.nextpoll = POLL_NODES
         self.movenumber = game.fullmove_number
-        self.move = chess.Move.null()
+        if self.sharedhash:
+            # the games sharing a table are at different move numbers, they count generations together
+            self.transposition.age = self.transposition.nextgeneration()
+        else:
+            self.transposition.age = self.movenumber
+        # moves are ints of the SearchBoard until they leave the search
+        self.move = 0
+        # (depth, move, score) of the deepest iteration that was searched to the end
+        self.completed = (-1, 0, 0)
         self.cutoff = 0
+        self.firstcutoff = 0
         self.nodes = 0
-        t1 = Thread(target = self.iterativedeepening, args = (game, maxtime, *args))
-        t2 = Thread(target = self.timemanegement, args = (game, maxtime, *args), daemon = True)
-        t2.start()
-        t1.start()
-        t1.join()
-
-        if ponder and self.resigned == False:
-            t3 = Thread(target = self.ponder, args = (self.move, game, *args), daemon = True)
-            self.abort_ponder = False
-            t3.start()
+        self.seldepth = 0
+        self.ttprobes = 0
+        self.tthits = 0
+        if self.tablebases:
+            self.tablebases.hits = 0
+        # (depth, seconds, nodes) at the end of every completed iteration
+        self.iterations = []
+        self.ordering.clear()
+
+    def collecthelpers(self):
+        # keeps the move of the deepest completed iteration among this process and the helpers
+        results = self.helpers.stop()
+        self.nodes += sum(result["nodes"] for result in results)
+        if results and results[0]["depth"] > self.completed[0]:
+            best = results[0]
+            logger.debug(f'SMP => helper depth: {best["depth"]}, move: {best["move"]}, eval: {best["score"]}')
+            self.move = self.job.board.from_chess_move(chess.Move.from_uci(best["move"]))
+            self.resigned = best["resigned"]
+            self.completed = (best["depth"], self.move, best["score"])
+
+    def searchinfo(self, game, depth, score, move):
+        # the chess.engine.InfoDict of a search at the root position `game` with the best move `move`
+        elapsed = self.job.clock.elapsed()
+        return {"depth": depth, "seldepth": max(depth, self.seldepth), "nodes": self.nodes,
+                "nps": int(self.nodes / max(elapsed, 0.001)), "time": elapsed,
+                "score": PovScore(Cp(round(score)), game.turn),
+                "pv": self.principalvariation(game, move, max(depth, 1)), "hashfull": self.transposition.hashfull(),
+                "tthits": self.tthits, "tbhits": self.tablebases.hits if self.tablebases else 0}
+
+    def principalvariation(self, game, move, length):
+        # `move` followed by the best moves stored in the transposition table, as chess.Moves
+        pv = []
+        while move and len(pv) < length and game.is_legal(move):
+            pv.append(game.to_chess_move(move))
+            game.push(move)
+            if game.repetition():
+                break
+            entry = self.transposition.probe(game.key)
+            move = entry[2] if entry else 0
+        for played in pv:
+            game.pop()
+        return pv
+
+    def quit(self):
+        self.stopsearch()
+        ponders = self.ponderhits + self.pondermisses
+        if ponders:
+            logger.info(f'ponder hits: {self.ponderhits}/{ponders} ({100 * self.ponderhits / ponders:.0f}%), '
+                        f'time saved: {self.pondersaved:.1f}s')
+        if self.helpers:
+            self.helpers.close()
+        if self.cache:
+            self.cache.save()
+            self.cache.close()
+        if self.tablebases:
+            self.tablebases.close()
+        self.transposition.close()
 
-        print('beta cutoffs:', self.cutoff)
-        print('nodes:', self.nodes)
+    def iterativedeepening (self, game, *args):
 
-        if (self.move != chess.Move.null()):
-            return PlayResult(self.move, None, resigned = self.resigned)
-        else:
-            print('null')
-            return PlayResult(list(game.legal_moves)[0], None)       
+        bestmove = 0
+        # iterations in a row that ended with the same best move
+        stability = 0
+        # odd helpers skip the first iteration to spread the helpers over two depths
+        depth = self.helper % 2
+
+        if self.cache and self.cacheable and game.fullmove_number <= MAX_FULLMOVE:
+            entry = self.cache.probe(game.key)
+            if entry is not None and game.is_legal(entry[2]):
+                score, cached, move, bound = entry
+                if cached >= self.cachedepth:
+                    logger.debug(f'ID => cached, depth: {cached}, move: {game.uci(move)}, eval: {score}')
+                    self.move = move
+                    self.completed = (cached, move, score)
+                    return
+                # a shallower result is searched first
+                bestmove = move
 
-    def iterativedeepening (self, game, *args):
-   
-        while self.cleanse:
-            print('.')
-            time.sleep(0.1)
-
-        maxdepth = 9
-        bestmove = chess.Move.null()
-        depth = 0
-
-        if len(list(game.legal_moves)) == 1:
-            print ('ID => onlymove')
-            self.move = list(game.legal_moves)[0]
+        legal = game.generate_moves()
+        if len(legal) == 1:
+            logger.debug('ID => onlymove')
+            # nothing to choose, one iteration only gives the depth and score of the search info
+            aval, move = self.rootsearch(game, legal, 1, -9999999, 9999999)
+            if not self.job.cancelled():
+                self.completed = (1, legal[0], aval)
+            self.move = legal[0]
             return
 
-        while (depth <= maxdepth):
-
-            movelist = self.ordermoves (game, bestmove)
-            alpha = -9999999
+        movelist = self.ordermoves (game, bestmove)
+        if self.helper:
+            # helpers search the root moves in their own order
+            rest = movelist[1:]
+            random.Random(self.helper).shuffle(rest)
+            movelist[1:] = rest
+        alpha = -9999999
+
+        while (depth <= self.depthlimit):
+
+            # aspiration window around the score of the previous iteration
+            if depth > 1 and abs(alpha) < 999999:
+                window = 50
+                lower = alpha - window
+                upper = alpha + window
+            else:
+                lower = -9999999
+                upper = 9999999
 
-            for move in movelist:
+            while True:
+                aval, move = self.rootsearch(game, movelist, depth, lower, upper)
 
-                game.push(move)
-                aval = -self.alphabeta(game, depth, -9999999, -alpha)
-                game.pop()
+                if move:
+                    bestmove = move
 
-                if self.abort:
-                    print(f'ID => depth: {depth}, move: {bestmove}, eval: {alpha}')
+                if self.job.cancelled():
+                    logger.debug(f'ID => depth: {depth}, move: {game.uci(bestmove)}, eval: {aval}')
                     self.move = bestmove
                     return
 
-                if aval > alpha:
-                    alpha = aval
-                    bestmove = move
+                if aval <= lower and lower > -9999999:
+                    lower = -9999999
+                elif aval >= upper and upper < 9999999:
+                    upper = 9999999
+                else:
+                    break
+
+            alpha = aval
+            if not bestmove:
+                # every move is mated
+                bestmove = movelist[0]
+            # best move first, then the moves that needed the biggest subtrees
+            movelist.remove(bestmove)
+            movelist.sort(key = lambda move: self.nodecounts.get(move, 0), reverse = True)
+            movelist.insert(0, bestmove)
+            stability = stability + 1 if bestmove == self.completed[1] else 0
+            self.completed = (depth, bestmove, alpha)
+            self.iterations.append((depth, self.job.clock.elapsed(), self.nodes))
+            if self.oninfo and self.ponderfen is None:
+                self.oninfo(self.searchinfo(game, depth, alpha, bestmove))
 
             depth = depth+1
 
             if alpha >= 9999999 or alpha <= -9999999:
-                print ('ID => mate score')
+                logger.debug('ID => mate score')
                 if alpha<-999999:
                     self.move = bestmove
                     self.resigned = True
                     return
                 self.move = bestmove
                 return
-                
+
+            if not self.job.clock.next_iteration(stability):
+                logger.debug(f'ID => out of time, depth: {depth}, move: {game.uci(bestmove)}, eval: {alpha}')
+                self.move = bestmove
+                return
         
         if alpha < -500:
-            print(f'ID => Resigned, depth: {depth}, move: {bestmove}, eval: {alpha}')
+            logger.debug(f'ID => Resigned, depth: {depth}, move: {game.uci(bestmove)}, eval: {alpha}')
             self.move = bestmove
             self.resigned = True
             return
-        print(f'ID => maxdepth reached, depth: {depth}, move: {bestmove}, eval: {alpha}')
+        logger.debug(f'ID => maxdepth reached, depth: {depth}, move: {game.uci(bestmove)}, eval: {alpha}')
         self.move = bestmove
         return
             
-    def alphabeta(self, game, depth, alpha, beta):
+    def rootsearch(self, game, movelist, depth, alpha, beta):
+        # returns (alpha, bestmove), bestmove is 0 when nothing raised alpha
+        bestmove = 0
+        self.nodecounts = {}
 
+        for i, move in enumerate(movelist):
+            nodes = self.nodes
+            game.push(move)
+            if i == 0:
+                aval = -self.alphabeta(game, depth, -beta, -alpha, 1)
+            else:
+                # principal variation search: prove with a null window that the move is worse
+                aval = -self.alphabeta(game, depth, -alpha-1, -alpha, 1)
+                if alpha < aval < beta:
+                    aval = -self.alphabeta(game, depth, -beta, -alpha, 1)
+            game.pop()
+            self.nodecounts[move] = self.nodes - nodes
 
-        hash = chess.polyglot.zobrist_hash(game)
+            if self.job.cancelled():
+                break
 
-        if hash in self.transposition:
-            if depth <= self.transposition.get(hash)[1][0]:
-                return self.transposition.get(hash)[0][0]
-            else:
-                bestmove = self.transposition.get(hash)[2][0]
-                movelist = self.ordermoves(game, bestmove)
+            if aval > alpha:
+                alpha = aval
+                bestmove = move
+                if alpha >= beta:
+                    break
 
-        elif depth == 0:
-            return self.dinamiceval(game, alpha, beta)
+        return alpha, bestmove
 
-        else:
-            movelist = self.ordermoves(game, chess.Move.null())
-            # detects if the game endded
-            if len(movelist) == 0:
-                if game.is_checkmate(): return -9999999
-                else: return 0
-            elif game.can_claim_threefold_repetition():
+    def alphabeta(self, game, depth, alpha, beta, ply):
+
+        if self.nodes >= self.nextpoll:
+            self.nextpoll = self.nodes + POLL_NODES
+            if self.job.clock.expired(self.nodes):
+                self.job.cancel()
                 return 0
-            bestmove = movelist[0]
 
-        for move in movelist:
+        if game.repetition():
+            return 0
+
+        # with few pieces left the tables know the result, nothing below needs searching
+        if self.tablebases and self.tablebases.applies(game):
+            wdl = self.tablebases.probe_wdl(game)
+            if wdl is not None:
+                return wdl_score(wdl, ply)
+
+        hash = game.key
+        alphaorig = alpha
+        bestmove = 0
+
+        entry = self.transposition.probe(hash)
+        self.ttprobes += 1
+
+        if entry is not None:
+            self.tthits += 1
+            score, ttdepth, bestmove, bound = entry
+            if depth <= ttdepth:
+                if bound == BOUND_EXACT:
+                    return score
+                elif bound == BOUND_LOWER and score >= beta:
+                    return beta
+                elif bound == BOUND_UPPER and score <= alpha:
+                    return alpha
+
+        if depth == 0:
+            return self.dinamiceval(game, alpha, beta, ply)
+
+        incheck = game.is_check()
+
+        # null move pruning, skipped with only pawns left where zugzwang is common
+        if (self.nullmove and depth > self.nullreduction and not incheck and beta < 999999
+                and game.peek() and game.occupied_co[game.turn] & ~(game.pawns | game.kings)):
+            game.push(0)
+            temp = -self.alphabeta(game, depth-1-self.nullreduction, -beta, -beta+1, ply+1)
+            game.pop()
+
+            if self.job.cancelled(): return 0
+
+            if temp >= beta:
+                return beta
+
+        searched = 0
+        for move in self.ordering.moves(game, bestmove, ply):
+            # late move reductions for quiet moves at the end of the ordering
+            reduction = 0
+            if (self.lmr and searched >= self.lmrmoves and depth >= 3 and not incheck
+                    and not move >> 12 and not game.is_capture(move)):
+                reduction = 1
+
             game.push(move)
-            temp = -self.alphabeta(game, depth-1, -beta, -alpha)
+            if searched == 0:
+                temp = -self.alphabeta(game, depth-1, -beta, -alpha, ply+1)
+            else:
+                if reduction and game.is_check():
+                    reduction = 0
+                temp = -self.alphabeta(game, depth-1-reduction, -alpha-1, -alpha, ply+1)
+                if reduction and temp > alpha:
+                    temp = -self.alphabeta(game, depth-1, -alpha-1, -alpha, ply+1)
+                if alpha < temp < beta:
+                    temp = -self.alphabeta(game, depth-1, -beta, -alpha, ply+1)
             game.pop()
 
-            if self.abort: return 0
+            if self.job.cancelled(): return 0
 
             if temp >= beta:
                 self.cutoff += 1
+                if searched == 0:
+                    self.firstcutoff += 1
+                self.ordering.update(game, move, depth, ply)
+                self.transposition.store(hash, beta, depth, move, BOUND_LOWER)
                 return beta
+
+            searched += 1
+            if searched == 1:
+                bestmove = move
             
             if temp > alpha:
                 alpha = temp
                 bestmove = move
+
+        # detects if the game endded
+        if searched == 0:
+            if incheck: return -9999999
+            else: return 0
         
-        self.transposition.update({hash: [[alpha], [depth], [bestmove], [self.movenumber]]})
+        if alpha > alphaorig:
+            self.transposition.store(hash, alpha, depth, bestmove, BOUND_EXACT)
+        else:
+            self.transposition.store(hash, alpha, depth, bestmove, BOUND_UPPER)
 
         return alpha
 
-    def dinamiceval(self, game, alpha, beta):
+    def dinamiceval(self, game, alpha, beta, ply):
+        if ply > self.seldepth:
+            self.seldepth = ply
 
-        aval = self.eval(game)
-        if aval >= beta:
-            return beta
-        
-        if aval > alpha:
-            alpha = aval
-        
-        movelist = self.captureordering(game)
-
-        for move in movelist:
-
-            if game.is_capture(move):
+        if game.is_check():
+            # no standing pat in check: every evasion is searched and having none is mate
+            evasions = 0
+            for move in game.generate_moves():
+                evasions += 1
                 game.push(move)
-                aval = -self.dinamiceval(game, -beta, -alpha)
+                aval = -self.dinamiceval(game, -beta, -alpha, ply+1)
                 game.pop()
 
                 if aval >= beta:
                     return beta
-                
+
                 if aval > alpha:
                     alpha = aval
-                
-        return alpha
-
-    def ordermoves(self, game, bestmove):
-
-        moves = list(game.legal_moves)
-        if bestmove != chess.Move.null():
-            movesordered = [bestmove]
-            moves.pop(moves.index(bestmove))
-        else:
-            movesordered = []
 
-        i = 0
-        for move in moves:
-            
-            if game.gives_check(move):
-                movesordered.append(move)
-                moves.pop(i)
-            i = i+1
+            if evasions == 0:
+                return -9999999
+            return alpha
 
-        i = 0
-        captures = {}
-        for move in moves:
-            
-            if game.is_capture(move):
-                if game.is_en_passant(move):
-                    captures.update({move: 0})
-                else:
-                    captures.update({move: self.capturescore(game, move)})
-                moves.pop(i)
-            i = i+1
+        standpat = self.eval(game)
+        if standpat >= beta:
+            return beta
+        
+        if standpat > alpha:
+            alpha = standpat
+        
+        movelist = self.captureordering(game)
 
-        sorte =  sorted(captures.items(), key = lambda x:x[1], reverse = True)
-        for move in sorte:
-            movesordered.append(move[0])
+        for score, move in movelist:
 
-        i = 0
-        for move in moves:
-            if move.promotion:
-                movesordered.append(move)
-                moves.pop(i)
+            # delta pruning: not even winning the captured piece and a margin can raise alpha
+            if standpat + SEE_VALUES[game.piece_type_at(move >> 6 & 63) or chess.PAWN] + 200 <= alpha and not move >> 12:
+                continue
 
-            i = i + 1
+            # a capture that loses material in the exchange
+            if score < 0 and see(game, move) < 0:
+                continue
 
-        i = 0
-        for move in moves:
-            if game.is_castling(move):
-                movesordered.append(move)
-                moves.pop(i)
+            game.push(move)
+            aval = -self.dinamiceval(game, -beta, -alpha, ply+1)
+            game.pop()
 
-            i = i + 1
+            if aval >= beta:
+                return beta
+            
+            if aval > alpha:
+                alpha = aval
+                
+        return alpha
 
-        for move in moves:
-            movesordered.append(move)
-        
-        return movesordered
+    def ordermoves(self, game, bestmove):
+        return list(self.ordering.moves(game, bestmove, 0))
 
     def capturescore (self, game, move):
-        return self.piecevalue(game.piece_at(move.to_square)) - self.piecevalue(game.piece_at(move.from_square))
-
-    def piecevalue(self, piece):
-        if piece.piece_type == 1: return 1
-        elif piece.piece_type == 2: return 3
-        elif piece.piece_type == 3: return 3
-        elif piece.piece_type == 4: return 5
-        elif piece.piece_type == 5: return 9
+        return self.piecevalue(game.piece_type_at(move >> 6 & 63)) - self.piecevalue(game.piece_type_at(move & 63))
+
+    def piecevalue(self, piece_type):
+        if piece_type == 1: return 1
+        elif piece_type == 2: return 3
+        elif piece_type == 3: return 3
+        elif piece_type == 4: return 5
+        elif piece_type == 5: return 9
         else: return 0
 
     def captureordering (self, game):
-        
-        moves = game.legal_moves
-        movesordered = []
-        captures = {}
-
-        for move in moves:
-            if game.is_capture(move):
-                if game.is_en_passant(move):
-                    captures.update({move: 0})
-                else:
-                    captures.update({move: self.capturescore(game, move)})
+        # (capturescore, move) of the legal captures, best first
+        captures = []
 
-        sorte =  sorted(captures.items(), key = lambda x:x[1], reverse = True)
-        for move in sorte:
-            movesordered.append(move[0])
+        for move in game.generate_moves(quiets=False):
+            if game.is_en_passant(move):
+                captures.append((0, move))
+            else:
+                captures.append((self.capturescore(game, move), move))
 
-        return movesordered
+        captures.sort(key = lambda x:x[0], reverse = True)
+
+        return captures
 
     def eval(self, game):
         self.nodes += 1
         
-        hash = chess.polyglot.zobrist_hash(game)
-
-        if hash in self.evaltt:
-            return self.evaltt.get(hash)[0]
+        hash = game.key
 
-        
-        if len(list(game.legal_moves)) == 0:
-            if game.is_checkmate(): return -9999999
-            else: return 0
-        elif game.can_claim_threefold_repetition():
-            return 0
+        score = self.evaltt.get(hash)
+        if score is not None:
+            return score
 
         else:
 
-            self.wp = game.pieces(chess.PAWN, chess.WHITE)
-            self.bp = game.pieces(chess.PAWN, chess.BLACK)
-            self.wn = game.pieces(chess.KNIGHT, chess.WHITE)
-            self.bn = game.pieces(chess.KNIGHT, chess.BLACK)
-            self.wb = game.pieces(chess.BISHOP, chess.WHITE)
-            self.bb = game.pieces(chess.BISHOP, chess.BLACK)
-            self.wr = game.pieces(chess.ROOK, chess.WHITE)
-            self.br = game.pieces(chess.ROOK, chess.BLACK)
-            self.wq = game.pieces(chess.QUEEN, chess.WHITE)
-            self.bq = game.pieces(chess.QUEEN, chess.BLACK)
-            self.wking = game.king(chess.WHITE)
-            self.bking = game.king(chess.BLACK)
-            nofpieces = self.pieces()
-
-            if game.turn == chess.WHITE:
-                score = self.pawns(game) + self.kingposition(nofpieces, game) + self.bishops(game) + self.knights(game) + self.rooks(game) + self.queens(game)
-            else:
-                score = - (self.pawns(game) + self.kingposition(nofpieces, game) + self.bishops(game) + self.knights(game) + self.rooks(game) + self.queens(game))
+            self.wking = (game.kings & game.occupied_co[chess.WHITE]).bit_length() - 1
+            self.bking = (game.kings & game.occupied_co[chess.BLACK]).bit_length() - 1
+            # (knights, bishops, rooks, queens, attacked squares) of each side
+            self.wmob = mobility(game, chess.WHITE)
+            self.bmob = mobility(game, chess.BLACK)
+            nofpieces = self.pieces(game)
 
-            self.evaltt.update({hash : [score, self.movenumber]})
+            # whole centipawns, the transposition table stores scores as ints and fractional weights would be truncated
+            score = round(game.psqtscore + self.pawns(game) + self.kingposition(nofpieces, game) + self.bishops(game) + self.knights(game) + self.rooks(game) + self.queens(game))
+            if game.turn == chess.BLACK:
+                score = -score
+
+            self.evaltt.store(hash, score)
 
             return score
 
-    def pieces (self):
-        return len(self.wn) + len(self.bn) + len(self.wb) + len(self.bb) + len(self.wr) + len(self.br) + 3*(len(self.wq) + len(self.bq))
+    def pieces (self, game):
+        return (game.knights | game.bishops | game.rooks).bit_count() + 3*game.queens.bit_count()
+
+    def psqttables (self):
+        # material and piece-square values, white's point of view, summed
+        # incrementally by the SearchBoard: psqt[color][piece_type][square]
+        values = self.piecevalues
+        psqt = [[[0]*64 for piece_type in range(7)] for color in chess.COLORS]
+
+        for square in chess.SQUARES:
+            for piece_type in chess.PIECE_TYPES:
+                psqt[chess.WHITE][piece_type][square] = values[piece_type]
+                psqt[chess.BLACK][piece_type][square] = -values[piece_type]
+            psqt[chess.WHITE][chess.KNIGHT][square] += self.knightmap[square]
+            psqt[chess.BLACK][chess.KNIGHT][square] -= self.knightmap[square]
+            psqt[chess.WHITE][chess.KING][square] = self.kingmap[square]
+            psqt[chess.BLACK][chess.KING][square] = self.kingmap[square]
+
+        return psqt
 
     def kingposition (self, nofpieces, game):
 
         if nofpieces > 10:
-            score = 0
-            for s in game.attacks(self.wking):
-                if game.is_attacked_by(chess.BLACK, s):
-                    score -= 20
-            for s in game.attacks(self.bking):
-                if game.is_attacked_by(chess.WHITE, s):
-                    score += 20
-            return self.kingmap[self.wking] + self.kingmap[self.bking] + score
+            score = self.kingattack*(chess.BB_KING_ATTACKS[self.bking] & self.wmob[4]).bit_count()
+            score -= self.kingattack*(chess.BB_KING_ATTACKS[self.wking] & self.bmob[4]).bit_count()
+            return game.kingscore + score
         else:
             w = (chess.square_file(self.wking) - 4)**2
             b = (chess.square_file(self.bking) - 4)**2
-            return -w + (chess.square_rank(self.wking)*3) + b + (chess.square_rank(self.bking)*3)
+            return self.kingfile*(b - w) + self.kingrank*(chess.square_rank(self.wking) + chess.square_rank(self.bking))
 
     def bishops (self, game):
         
-        score = 0
-        if len(self.wb) == 2:
-            for wb in self.wb:
-                score += 2*len(game.attacks(wb)) + 350
+        score = self.bishopmobility*(self.wmob[1] - self.bmob[1])
 
+        wb = game.bishops & game.occupied_co[chess.WHITE]
+        if wb.bit_count() == 2:
+            score += self.bishoppair
         else:
-            for wb in self.wb:
-                score += 2*len(game.attacks(wb)) + 315
-                for wp in self.wp:
-                    if wp%2 == wb%2:
-                        score = score - 14
-
-        if len(self.bb) == 2:
-            for bb in self.bb:
-                score = score - 2*len(game.attacks(bb)) - 350
+            wp = game.pawns & game.occupied_co[chess.WHITE]
+            for b in chess.scan_forward(wb):
+                score -= self.bishopparity*(wp & SAME_PARITY[b]).bit_count()
+
+        bb = game.bishops & game.occupied_co[chess.BLACK]
+        if bb.bit_count() == 2:
+            score -= self.bishoppair
         else:
-            for bb in self.bb:
-                score = score - 2*len(game.attacks(bb)) - 315
-                for bp in self.bp:
-                    if bp%2 == bb%2:
-                        score = score + 14
+            bp = game.pawns & game.occupied_co[chess.BLACK]
+            for b in chess.scan_forward(bb):
+                score += self.bishopparity*(bp & SAME_PARITY[b]).bit_count()
         return score
 
     def pawns (self, game):
 
-        s = 0
-        for p in self.wp:
-            s += 100
-            r = chess.square_rank(p)
-            passed = True
-            for i in range(8-r):
-                if (p+8*(1+i)) < 56:
-                    if game.piece_at(p+8*(1+i)) == chess.Piece(1, chess.BLACK): passed = False
-                    elif game.piece_at(p+8*(1+i)) == chess.Piece(1, chess.WHITE): s -= 40
-            if passed:
-                s = s + 40 + 2*(r**2)
-            if chess.square_distance(p, self.wking) < 3: s = s + 30
-
-        for p in self.bp:
-            s -= 100
-            r = chess.square_rank(p)
-            passed = True
-            for i in range(r):
-                if (p-8*(1+i)) > 7:
-                    if game.piece_at(p-8*(1+i)) == chess.Piece(1, chess.WHITE): passed = False
-                    elif game.piece_at(p-8*(1+i)) == chess.Piece(1, chess.BLACK): s += 40
-            if passed:
-                s = s - 40 - 2*((8-r)**2)
-            if chess.square_distance(p, self.bking) < 3: s = s - 30
+        wp = game.pawns & game.occupied_co[chess.WHITE]
+        bp = game.pawns & game.occupied_co[chess.BLACK]
+        s = self.pawntable.score(game.pawnkey, wp, bp)
+        s += self.kingpawns*(wp & KING_PROXIMITY[self.wking]).bit_count()
+        s -= self.kingpawns*(bp & KING_PROXIMITY[self.bking]).bit_count()
 
         return s
 
     def rooks (self, game):
 
-        s = 0
-        for r in self.wr:
-            s += len(game.attacks(r)) + 500
-
-        for r in self.br:
-            s -= (len(game.attacks(r)) + 500)
-        return s
+        return self.rookmobility*(self.wmob[2] - self.bmob[2])
 
     def queens (self, game):
 
-        s = 0
-        for q in self.wq:
-            s += 900 + len(game.attacks(q))/2
-
-        for q in self.bq:
-            s = s - 900 - len(game.attacks(q))/2
-        return s
+        return self.queenmobility*(self.wmob[3] - self.bmob[3])
 
 
 
@@ -509,133 +789,11 @@ class esbelto(MinimalEngine):
 
     def knights (self, game):
 
-        score = 0
-        for i in self.wn:
-            score = score + 300 + self.knightmap[i] - 2*(chess.square_distance(i, self.wking) - len(game.attacks(i)))
+        score = self.knightmobility*(self.wmob[0] - self.bmob[0])
+        for i in chess.scan_forward(game.knights & game.occupied_co[chess.WHITE]):
+            score = score - self.knightdistance*chess.square_distance(i, self.wking)
         
-        for j in self.bn:
-            score = score - 300 - self.knightmap[j] + 2*(chess.square_distance(j, self.bking) - len(game.attacks(j)))
+        for j in chess.scan_forward(game.knights & game.occupied_co[chess.BLACK]):
+            score = score + self.knightdistance*chess.square_distance(j, self.bking)
 
         return score
-    
-    def timemanegement (self, game, maxtime, *args):
-        self.shouldabort = True
-        if maxtime.time is None:
-            if self.movenumber < 15:
-                if game.turn == chess.WHITE:
-                    maxtime = maxtime.white_clock/20
-                else:
-                    maxtime = maxtime.black_clock/20
-            else:
-                if game.turn == chess.WHITE:
-                    maxtime = maxtime.white_clock/13
-                else:
-                    maxtime = maxtime.black_clock/13
-        else:
-            maxtime = maxtime.time
-        
-        print('Tempo:', maxtime)
-        time.sleep(maxtime)
-        if self.shouldabort:
-            self.abort = True
-
-    def ponder (self, newmove, game, *args):
-
-        self.cleanse = True
-        game.push(newmove)
-        maxdepth = 5
-        bestmove = chess.Move.null()
-        depth = 0
-        
-        if self.movenumber % 2 == 0:
-
-            for hash in self.transposition:
-                temp = self.transposition.get(hash)
-                if (self.movenumber - temp[3][0]) > 2:
-                    self.temptt.update({hash: self.transposition.get(hash)})
-
-            for hash in self.evaltt:
-                temp = self.evaltt.get(hash)
-                if (self.movenumber - temp[1]) > 3:
-                    self.tempeval.update({hash: temp})
-
-            self.transposition = self.temptt
-            self.evaltt = self.tempeval
-            self.temptt = {}
-            self.tempeval = {}
-
-        self.cleanse = False
-
-        while (depth <= maxdepth):
-
-            movelist = self.ordermoves (game, bestmove)
-            alpha = -9999999
-
-            for move in movelist:
-
-                game.push(move)
-                aval = -self.alphabetaponder(game, depth, -9999999, -alpha)
-                game.pop()
-
-                if self.abort_ponder:
-                    game.pop()
-                    print(f'ponder => depth: {depth}, move: {bestmove}, eval: {alpha}') 
-                    return
-
-                if aval > alpha:
-                    alpha = aval
-                    bestmove = move
-
-            depth = depth+1
-
-            if alpha >= 9999999 or alpha <= -9999999:
-                game.pop()
-                print ('ponder: mate score')
-                return
-
-        print ('ponder reached maxdepth')    
-        return
-         
-    def alphabetaponder (self, game, depth, alpha, beta):
-
-        hash = chess.polyglot.zobrist_hash(game)
-
-        if hash in self.transposition:
-            if depth <= self.transposition.get(hash)[1][0]:
-                return self.transposition.get(hash)[0][0]
-            else:
-                bestmove = self.transposition.get(hash)[2][0]
-                movelist = self.ordermoves(game, bestmove)
-
-        elif depth == 0:
-            return self.dinamiceval(game, alpha, beta)
-
-        else:
-            movelist = self.ordermoves(game, chess.Move.null())
-            # detects if the game endded
-            if len(movelist) == 0:
-                if game.is_checkmate(): return -9999999
-                else: return 0
-            elif game.can_claim_threefold_repetition():
-                return 0
-            bestmove = movelist[0]
-
-        for move in movelist:
-            game.push(move)
-            temp = -self.alphabetaponder(game, depth-1, -beta, -alpha)
-            game.pop()
-
-            if self.abort_ponder: return 0
-
-            if temp >= beta:
-                self.cutoff += 1
-                return beta
-            
-            if temp > alpha:
-                alpha = temp
-                bestmove = move
-        
-        self.transposition.update({hash: [[alpha], [depth], [bestmove], [self.movenumber]]})
-
-        return alpha
-
@@ -0,0 +1,102 @@
+"""
+Local Syzygy tablebases for esbelto, probed at the root and in the search.
+"""
+
+import os
+import chess
+import chess.syzygy
+
+# score of a tablebase win, above every evaluation and below the mate scores of the search
+TB_WIN = 100000
+# probe results kept per process, the cache starts over when it is full
+CACHE_SIZE = 1 << 18
+
+
+def wdl_score(wdl, ply=0):
+    """The search score of `wdl`, wins found closer to the root score higher."""
+    if wdl == 2:
+        return TB_WIN - ply
+    if wdl == -2:
+        return -TB_WIN + ply
+    # cursed wins and blessed losses are draws by the 50 move rule
+    return 0
+
+
+class Tablebases:
+    """
+    The Syzygy tables in `path`, several directories separated by os.pathsep.
+
+    Positions with more than `probelimit` pieces, or more than the largest
+    table found, are never probed.
+    """
+    def __init__(self, path, probelimit=7):
+        self.tablebase = chess.syzygy.Tablebase()
+        for directory in path.split(os.pathsep):
+            if directory:
+                self.tablebase.add_directory(directory)
+        # table names are the pieces of both sides, "KQvK"
+        largest = max((len(name) - 1 for name in self.tablebase.wdl), default=0)
+        self.pieces = min(probelimit, largest)
+        self.cache = {}
+        self.hits = 0
+
+    def close(self):
+        self.tablebase.close()
+
+    def applies(self, board):
+        """Whether `board`, a chess.Board or SearchBoard, has few enough pieces and no castling rights."""
+        return bool(self.pieces) and not board.castling_rights and chess.popcount(board.occupied) <= self.pieces
+
+    def probe_wdl(self, board):
+        """The WDL of the SearchBoard `board` for the side to move, or None if its table is missing."""
+        key = board.key
+        if key in self.cache:
+            wdl = self.cache[key]
+        else:
+            wdl = self.tablebase.get_wdl(board.to_board())
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.clear()
+            self.cache[key] = wdl
+        if wdl is not None:
+            self.hits += 1
+        return wdl
+
+    def root(self, board):
+        """
+        Returns (move, wdl) with the best move of the chess.Board `board` by DTZ,
+        or None if a table is missing.
+
+        Winning moves that reset the 50 move counter come first, then the wins
+        closest to the next reset. Losing moves are ordered the other way around.
+        """
+        best = None
+        for move in board.legal_moves:
+            zeroing = board.is_zeroing(move)
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    return move, 2
+                wdl = -self.tablebase.probe_wdl(board)
+                dtz = abs(self.tablebase.probe_dtz(board)) + 1
+            except chess.syzygy.MissingTableError:
+                return None
+            finally:
+                board.pop()
+            self.hits += 1
+
+            if wdl == 2 and not zeroing and dtz + board.halfmove_clock > 100:
+                wdl = 1
+            elif wdl == -2 and not zeroing and dtz + board.halfmove_clock > 100:
+                wdl = -1
+            if wdl > 0:
+                rank = (wdl, -1 if zeroing else -dtz)
+            elif wdl < 0:
+                rank = (wdl, 0 if zeroing else dtz)
+            else:
+                rank = (0, 0)
+            if best is None or rank > best[0]:
+                best = (rank, move, wdl)
+
+        if best is None:
+            return None
+        return best[1], best[2]
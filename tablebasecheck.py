@@ -0,0 +1,148 @@
+"""
+Checks Tablebases.root and the tablebase probes of the search against an in-memory stand-in for the Syzygy tables.
+
+    python tablebasecheck.py
+"""
+
+import chess
+import chess.syzygy
+from chess.engine import Limit, Cp
+import strategies
+from tablebase import Tablebases, TB_WIN
+
+
+def position(board):
+    return f"{board.board_fen()} {'w' if board.turn == chess.WHITE else 'b'}"
+
+
+class StandInTables:
+    """
+    Answers probe_wdl, probe_dtz and get_wdl like chess.syzygy.Tablebase.
+
+    Positions in `results` get their (wdl, dtz), other positions are passed
+    to `rule`, which returns a wdl or None for a missing table. DTZ of
+    positions that are not in `results` is always missing.
+    """
+    def __init__(self, results=None, rule=None):
+        self.results = results or {}
+        self.rule = rule
+        # get_wdl calls, the probes of the search
+        self.lookups = 0
+
+    def probe_wdl(self, board):
+        if position(board) in self.results:
+            return self.results[position(board)][0]
+        wdl = self.rule(board) if self.rule else None
+        if wdl is None:
+            raise chess.syzygy.MissingTableError(position(board))
+        return wdl
+
+    def probe_dtz(self, board):
+        if position(board) not in self.results:
+            raise chess.syzygy.MissingTableError(position(board))
+        return self.results[position(board)][1]
+
+    def get_wdl(self, board):
+        self.lookups += 1
+        try:
+            return self.probe_wdl(board)
+        except chess.syzygy.MissingTableError:
+            return None
+
+    def close(self):
+        pass
+
+
+def tablebases(tables):
+    result = Tablebases("")
+    result.tablebase = tables
+    result.pieces = 5
+    return result
+
+
+def children(fen, default, moves):
+    """Stand-in results of every move of `fen`: (wdl, dtz) of `moves` by uci, `default` for the others, None to leave one out."""
+    board = chess.Board(fen)
+    results = {}
+    for move in board.legal_moves:
+        result = moves.get(move.uci(), default)
+        if result is not None:
+            board.push(move)
+            results[position(board)] = result
+            board.pop()
+    return results
+
+
+WHITE_WINS = "4k3/8/8/8/8/8/P7/1Q2K3 w - - {} 1"
+BLACK_LOSES = "4k3/8/8/8/8/8/P7/1Q2K3 b - - {} 1"
+
+# (name, fen, default child result, child results by move, expected (move, wdl) or None)
+# child results are (wdl, dtz) for the side to move after the move
+ROOT_CASES = [
+    ("zeroing win first", WHITE_WINS.format(0), (-2, -5), {"b1b7": (-2, -1), "a2a3": (-2, -20), "a2a4": (0, 0)},
+     ("a2a3", 2)),
+    ("fastest win", WHITE_WINS.format(0), (-2, -5), {"b1b7": (-2, -1), "a2a3": (0, 0), "a2a4": (0, 0)},
+     ("b1b7", 2)),
+    ("win inside the 50 moves", WHITE_WINS.format(97), (-2, -5), {"b1b7": (-2, -1), "a2a3": (0, 0), "a2a4": (0, 0)},
+     ("b1b7", 2)),
+    ("cursed win", WHITE_WINS.format(99), (-2, -5), {"b1b7": (-2, -1), "a2a3": (0, 0), "a2a4": (0, 0)},
+     ("b1b7", 1)),
+    ("zeroing win before cursed wins", WHITE_WINS.format(99), (-2, -1), {"a2a3": (-2, -30), "a2a4": (0, 0)},
+     ("a2a3", 2)),
+    ("slowest loss", BLACK_LOSES.format(0), (2, 5), {"e8d7": (2, 30), "e8f7": (2, 10)},
+     ("e8d7", -2)),
+    ("blessed loss", BLACK_LOSES.format(80), (2, 5), {"e8d7": (2, 30), "e8f7": (2, 10)},
+     ("e8d7", -1)),
+    ("draw before losses", BLACK_LOSES.format(0), (2, 5), {"e8d8": (0, 0)},
+     ("e8d8", 0)),
+    ("mate in one", "k7/8/1K6/8/8/8/8/7Q w - - 0 1", (0, 0), {},
+     ("h1h8", 2)),
+    ("missing table", WHITE_WINS.format(0), (-2, -5), {"b1b7": None},
+     None),
+]
+
+
+def check_root():
+    errors = []
+    for name, fen, default, moves, expected in ROOT_CASES:
+        result = tablebases(StandInTables(children(fen, default, moves))).root(chess.Board(fen))
+        got = None if result is None else (result[0].uci(), result[1])
+        print(f"{name:<32} root: {got} expected: {expected}")
+        if got != expected:
+            errors.append(name)
+    return errors
+
+
+def check_search():
+    """Searches a KQvKR position where the tables say KQvK is won and KQvKR drawn."""
+    def rule(board):
+        if board.rooks:
+            return 0
+        return 2 if board.turn == chess.WHITE else -2
+
+    tables = StandInTables(rule=rule)
+    engine = strategies.esbelto([], {"Hash": 1}, None, {})
+    engine.tablebases = tablebases(tables)
+    result = engine.search(chess.Board("r3k3/8/8/8/8/8/8/Q3K3 w - - 0 1"), Limit(depth=3), False, False)
+    engine.quit()
+    score = result.info["score"].white()
+    probed = len(engine.tablebases.cache)
+    print(f"{'search':<32} move: {result.move.uci()} score: {score} tbhits: {result.info['tbhits']} "
+          f"lookups: {tables.lookups} positions: {probed}")
+    errors = []
+    if result.move.uci() != "a1a8" or score != Cp(TB_WIN - 1):
+        errors.append("search move or score")
+    if tables.lookups != probed:
+        errors.append("search probed a cached position again")
+    return errors
+
+
+def main():
+    errors = check_root() + check_search()
+    if errors:
+        print(f"failed: {', '.join(errors)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
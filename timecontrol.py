@@ -0,0 +1,86 @@
+"""
+Time allocation for the esbelto search: soft, hard and node limits of one move.
+"""
+
+import time
+
+# the search checks the hard limit every POLL_NODES evaluated nodes
+POLL_NODES = 32
+# moves the remaining clock is spread over, never less than MIN_MOVES_TO_GO
+MOVES_TO_GO = 30
+MIN_MOVES_TO_GO = 12
+# the hard limit is at most HARD_FACTOR times the planned time and MAX_CLOCK_SHARE of the clock
+HARD_FACTOR = 4
+MAX_CLOCK_SHARE = 0.5
+# expected time of the next iteration relative to the last one
+DEFAULT_GROWTH = 3
+MIN_GROWTH = 1.5
+MAX_GROWTH = 6
+
+
+class SearchClock:
+    """
+    Soft and hard limits of one search, in seconds since it started.
+
+    It turns the chess.engine.Limit of a move into two limits on the
+    monotonic clock and a node limit:
+
+    * the soft limit is the time the move should take. No new iteration is
+      started after it, and it is stretched while the best move keeps changing
+      and shrunk once it has been stable for a few iterations.
+    * the hard limit is the time the move may take. The search polls it while
+      searching and aborts when it is reached, and an iteration is not started
+      when it is not expected to finish before it.
+    * the node limit is Limit.nodes, counted like the nodes of the engine. It is
+      polled with the hard limit and does not depend on the speed of the
+      machine, so a search limited by nodes or depth alone is reproducible.
+
+    `overhead` is kept in reserve on top of the move overhead lichess-bot
+    already takes off the clock, for the work around the search itself.
+    Without a time or a clock in `limit` the search is never stopped by time.
+    """
+    def __init__(self, limit, turn, fullmove_number, overhead=0.1):
+        self.start = time.monotonic()
+        # elapsed time at the end of every iteration
+        self.iterations = [0.0]
+        clock = limit.white_clock if turn else limit.black_clock
+        increment = (limit.white_inc if turn else limit.black_inc) or 0
+
+        if limit.time is not None:
+            self.soft = self.hard = max(0.01, limit.time - overhead)
+        elif clock is not None:
+            remaining = max(0.01, clock - overhead)
+            movestogo = limit.remaining_moves or max(MIN_MOVES_TO_GO, MOVES_TO_GO - fullmove_number // 2)
+            planned = remaining / movestogo + 0.75 * increment
+            self.hard = min(HARD_FACTOR * planned, MAX_CLOCK_SHARE * remaining)
+            self.soft = min(planned, self.hard)
+        else:
+            self.soft = self.hard = float("inf")
+
+        self.deadline = self.start + self.hard
+        self.maxnodes = limit.nodes if limit.nodes is not None else float("inf")
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def expired(self, nodes=0):
+        """True once the hard limit has passed or `nodes` reached the node limit."""
+        return nodes >= self.maxnodes or time.monotonic() >= self.deadline
+
+    def next_iteration(self, stability):
+        """
+        Called after every completed iteration, returns whether to start the next one.
+
+        `stability` is the number of iterations in a row that returned the same best move.
+        """
+        elapsed = self.elapsed()
+        self.iterations.append(elapsed)
+
+        if elapsed >= self.soft * max(0.5, 1.3 - 0.15 * stability):
+            return False
+
+        last = self.iterations[-1] - self.iterations[-2]
+        growth = DEFAULT_GROWTH
+        if len(self.iterations) >= 3 and self.iterations[-2] > self.iterations[-3]:
+            growth = min(MAX_GROWTH, max(MIN_GROWTH, last / (self.iterations[-2] - self.iterations[-3])))
+        return elapsed + growth * last <= self.hard
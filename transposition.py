@@ -0,0 +1,166 @@
+"""
+Fixed-size transposition table and evaluation cache for esbelto, optionally in shared memory.
+"""
+
+from array import array
+from multiprocessing import shared_memory, resource_tracker
+
+ENTRY_SIZE = 16  # bytes, one key word and one data word
+HEADER_SIZE = 16  # bytes, the generation and window words in front of the entries
+
+# words of the header
+GENERATION = 0
+WINDOW = 1
+
+# Layout of the data word, from the lowest bit:
+#   move  16 bits  (from | to << 6 | promotion << 12, as on the SearchBoard)
+#   depth  8 bits
+#   bound  2 bits
+#   age    6 bits
+#   score 32 bits, signed
+DEPTH_SHIFT = 16
+BOUND_SHIFT = 24
+AGE_SHIFT = 26
+SCORE_SHIFT = 32
+AGE_MASK = 0x3F
+WORD_MASK = 0xFFFFFFFFFFFFFFFF
+
+BOUND_EXACT = 0
+BOUND_LOWER = 1  # the score failed high, the true score is at least this
+BOUND_UPPER = 2  # the score failed low, the true score is at most this
+
+
+class TranspositionTable:
+    """
+    A transposition table of `megabytes` size, rounded down to a power of two buckets.
+
+    Every entry is a key word and a packed data word, in buckets of a
+    depth-preferred and an always-replace slot. Stale entries are never
+    cleared in bulk, they lose their slot to the next store.
+
+    `age` should be set by the engine before each search, entries from another
+    age are replaced regardless of their depth. In a table shared by several
+    games, created with a `window` above 0, every search takes its age from
+    nextgeneration() and entries are only replaced regardless of their depth
+    once they are more than `window` generations old.
+
+    With `shared` the table is allocated in shared memory, other processes
+    attach to it by passing its `name`. Only the creating process unlinks the
+    block in close(). Processes write without locks, so the key word is stored
+    xored with the data word: an entry torn by two concurrent writes no longer
+    matches its key and is treated as a miss.
+    """
+    def __init__(self, megabytes, shared=False, name=None, window=0):
+        buckets = max(1, int(megabytes * 1024 * 1024) // (2 * ENTRY_SIZE))
+        buckets = 1 << (buckets.bit_length() - 1)
+        self.mask = buckets - 1
+        self.age = 0
+        self.shm = None
+        self.name = None
+        self.owner = name is None
+
+        if shared or name:
+            size = 2 * buckets * ENTRY_SIZE
+            self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=HEADER_SIZE + size)
+            if name:
+                # the creating process owns the block, keep our tracker from unlinking it on exit
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+            self.name = self.shm.name
+            self.header = self.shm.buf[:HEADER_SIZE].cast("Q")
+            self.keys = self.shm.buf[HEADER_SIZE:HEADER_SIZE + size // 2].cast("Q")
+            self.data = self.shm.buf[HEADER_SIZE + size // 2:HEADER_SIZE + size].cast("q")
+            if name is None:
+                self.header[WINDOW] = min(window, AGE_MASK // 2)
+        else:
+            self.header = array("Q", [0, min(window, AGE_MASK // 2)])
+            self.keys = array("Q", [0]) * (2 * buckets)
+            self.data = array("q", [0]) * (2 * buckets)
+        # processes attaching by name take the window of the creator
+        self.window = self.header[WINDOW]
+
+    def close(self):
+        """Releases the shared memory block, if any."""
+        if self.shm is None:
+            return
+        self.header.release()
+        self.keys.release()
+        self.data.release()
+        self.shm.close()
+        if self.owner:
+            # processes forked from this one share its resource tracker and unregistered the block when they attached
+            resource_tracker.register(self.shm._name, "shared_memory")
+            self.shm.unlink()
+        self.shm = None
+
+    def nextgeneration(self):
+        """Starts the next generation of a shared table and returns it as the age of a new search."""
+        # two games may read the same generation, they then search with the same age
+        generation = (self.header[GENERATION] + 1) & AGE_MASK
+        self.header[GENERATION] = generation
+        return generation
+
+    def probe(self, key):
+        """Returns (score, depth, move, bound) for `key`, or None if it is not in the table."""
+        index = (key & self.mask) << 1
+        data = self.data[index]
+        if self.keys[index] ^ (data & WORD_MASK) != key:
+            index += 1
+            data = self.data[index]
+            if self.keys[index] ^ (data & WORD_MASK) != key:
+                return None
+        return (data >> SCORE_SHIFT, data >> DEPTH_SHIFT & 0xFF,
+                data & 0xFFFF, data >> BOUND_SHIFT & 0x3)
+
+    def store(self, key, score, depth, move, bound):
+        data = (int(score) << SCORE_SHIFT | (self.age & AGE_MASK) << AGE_SHIFT
+                | bound << BOUND_SHIFT | min(depth, 0xFF) << DEPTH_SHIFT | move)
+        index = (key & self.mask) << 1
+        old_data = self.data[index]
+        old_key = self.keys[index] ^ (old_data & WORD_MASK)
+        # in a shared table the generation has usually moved on since this search started
+        age = self.header[GENERATION] if self.window else self.age & AGE_MASK
+
+        if old_key == key or depth >= (old_data >> DEPTH_SHIFT & 0xFF) or (age - (old_data >> AGE_SHIFT)) & AGE_MASK > self.window:
+            # The depth-preferred slot gets the new entry, the entry it
+            # pushes out moves down to the always-replace slot.
+            if old_key != key and old_key:
+                self.keys[index + 1] = old_key ^ (old_data & WORD_MASK)
+                self.data[index + 1] = old_data
+            self.keys[index] = key ^ (data & WORD_MASK)
+            self.data[index] = data
+        else:
+            self.keys[index + 1] = key ^ (data & WORD_MASK)
+            self.data[index + 1] = data
+
+    def hashfull(self):
+        """Permille of the first thousand slots in use, like the UCI hashfull."""
+        sample = min(1000, len(self.data))
+        age = self.header[GENERATION] if self.window else self.age & AGE_MASK
+        used = sum(1 for index in range(sample)
+                   if self.keys[index] and (age - (self.data[index] >> AGE_SHIFT)) & AGE_MASK <= self.window)
+        return used * 1000 // sample
+
+
+class EvalTable:
+    """
+    A direct-mapped cache of static evaluations with 2**bits entries.
+
+    Evaluations only depend on the position, so an entry never goes stale and
+    a colliding position simply takes over the slot.
+    """
+    def __init__(self, bits=16):
+        self.mask = (1 << bits) - 1
+        self.keys = array("Q", [0]) * (1 << bits)
+        self.scores = array("q", [0]) * (1 << bits)
+
+    def get(self, key):
+        """The stored score of `key`, or None."""
+        index = key & self.mask
+        if self.keys[index] == key:
+            return self.scores[index]
+        return None
+
+    def store(self, key, score):
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = score
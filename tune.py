@@ -0,0 +1,176 @@
+"""
+Texel tuning of the esbelto evaluation weights.
+
+Reads the positions of a PGN file of games, or of an EPD file of positions
+labelled with the result of their game, extracts the evaluation features
+of all of them once with batcheval.features into one NumPy matrix, and
+fits the weights of evalweights.py so that a sigmoid of the evaluation
+predicts the results, with full batch gradient descent (Adam) on the mean
+squared error. The evaluation is linear in its weights, so every step is
+two products of the feature matrix with a vector and a run over a million
+positions takes minutes.
+
+    python tune.py games.pgn --output weights.json
+    python tune.py positions.epd --epochs 3000 --freeze piece_values --output weights.json
+
+The result goes to a JSON file that esbelto loads at init when it is set
+as EvalWeights in homemade_options. PGN positions are only kept when they
+are quiet enough for the static evaluation to mean something: not in
+check, not right after a capture or promotion, and past the first --skip
+plies of the game. EPD lines carry their result as a c9 or result opcode
+("1-0", "0-1", "1/2-1/2") or as a trailing [1.0], [0.5] or [0.0].
+"""
+
+import argparse
+import math
+import re
+import time
+import chess
+import chess.pgn
+import numpy as np
+import batcheval
+from evalweights import load_weights, save_weights
+
+RESULTS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5, "1.0": 1.0, "0.0": 0.0, "0.5": 0.5}
+EPD_RESULT = re.compile(r'\[(1\.0|0\.5|0\.0)\]|"?(1-0|0-1|1/2-1/2)"?\s*;?\s*$')
+# positions converted to features at a time
+CHUNK = 1 << 16
+
+
+def pgn_positions(path, skip):
+    """Yields (board, result) of the quiet positions of the games in `path`, the result for white."""
+    with open(path) as file:
+        while True:
+            game = chess.pgn.read_game(file)
+            if game is None:
+                return
+            result = RESULTS.get(game.headers.get("Result"))
+            if result is None:
+                continue
+            board = game.board()
+            for ply, move in enumerate(game.mainline_moves()):
+                noisy = board.is_capture(move) or move.promotion
+                board.push(move)
+                if ply + 1 >= skip and not noisy and not board.is_check():
+                    yield board, result
+
+
+def epd_positions(path):
+    """Yields (board, result) of the positions in `path`, the result for white."""
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            match = EPD_RESULT.search(line)
+            label = None
+            if match:
+                label = match.group(1) or match.group(2)
+                line = line[:match.start()]
+            board, operations = chess.Board.from_epd(line)
+            label = label or operations.get("c9") or operations.get("result")
+            if label in RESULTS:
+                yield board, RESULTS[label]
+
+
+def load_corpus(path, skip, limit=None):
+    """The feature matrix and the results of the positions in `path`."""
+    positions = epd_positions(path) if path.endswith(".epd") else pgn_positions(path, skip)
+    chunks = []
+    results = []
+    rows = []
+    for board, result in positions:
+        # PGN positions are one board that moves on, its bitboards are taken right away
+        rows.append(batcheval.row(board))
+        results.append(result)
+        if len(rows) == CHUNK:
+            chunks.append(batcheval.features(np.array(rows, dtype=np.uint64)))
+            rows = []
+        if limit and len(results) >= limit:
+            break
+    if rows:
+        chunks.append(batcheval.features(np.array(rows, dtype=np.uint64)))
+    if not chunks:
+        raise ValueError(f"no labelled positions in {path}")
+    return np.concatenate(chunks), np.array(results, dtype=np.float32)
+
+
+def sigmoid(scores, k):
+    """The expected result for white of the white evaluation `scores`."""
+    return 1 / (1 + np.power(10, -k * scores / 400))
+
+
+def error(features, results, vector, k):
+    return float(np.mean((results - sigmoid(features @ vector, k)) ** 2))
+
+
+def fit_k(features, results, vector, low=0.1, high=3.0, steps=40):
+    """The scaling constant of the sigmoid that fits the weights `vector` best, by ternary search."""
+    for step in range(steps):
+        a = low + (high - low) / 3
+        b = high - (high - low) / 3
+        if error(features, results, vector, a) < error(features, results, vector, b):
+            high = b
+        else:
+            low = a
+    return (low + high) / 2
+
+
+def tune(features, results, vector, k, epochs, rate, frozen, report=100):
+    """Minimises the error of `vector` with Adam, the columns in the mask `frozen` stay as they are."""
+    vector = vector.copy()
+    moment = np.zeros_like(vector)
+    velocity = np.zeros_like(vector)
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+    scale = np.float32(2 * k * math.log(10) / 400 / len(results))
+
+    for epoch in range(1, epochs + 1):
+        predicted = sigmoid(features @ vector, k)
+        residual = (predicted - results) * predicted * (1 - predicted)
+        gradient = (residual @ features) * scale
+        gradient[frozen] = 0
+        moment = beta1 * moment + (1 - beta1) * gradient
+        velocity = beta2 * velocity + (1 - beta2) * gradient ** 2
+        step = rate * (moment / (1 - beta1 ** epoch)) / (np.sqrt(velocity / (1 - beta2 ** epoch)) + epsilon)
+        vector -= step.astype(np.float32)
+        if epoch % report == 0 or epoch == epochs:
+            print(f"epoch: {epoch:>5} error: {error(features, results, vector, k):.6f}")
+    return vector
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Texel tuning of the esbelto evaluation weights")
+    parser.add_argument("corpus", help="PGN file of games, or .epd file of positions with results.")
+    parser.add_argument("--output", default="weights.json", help="JSON file to write the tuned weights to.")
+    parser.add_argument("--weights", help="JSON file of weights to start from, the defaults otherwise.")
+    parser.add_argument("--epochs", type=int, default=1000, help="Gradient descent steps over the whole corpus.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Learning rate, in centipawns per step.")
+    parser.add_argument("--skip", type=int, default=8, help="Opening plies of every PGN game that are not used.")
+    parser.add_argument("--limit", type=int, help="Use at most this many positions.")
+    parser.add_argument("--freeze", action="append", default=[], choices=list(batcheval.COLUMNS), metavar="NAME",
+                        help="Weight that is not tuned, as named in evalweights.py. Can be given several times.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    features, results = load_corpus(args.corpus, args.skip, args.limit)
+    print(f"positions: {len(results)} features: {features.shape[1]} time: {time.perf_counter() - start:.1f}s")
+
+    weights = load_weights(args.weights)
+    vector = batcheval.weight_vector(weights).astype(np.float32)
+    frozen = np.zeros(len(vector), dtype=bool)
+    for name in args.freeze:
+        frozen[batcheval.COLUMNS[name]] = True
+
+    k = fit_k(features, results, vector)
+    print(f"k: {k:.4f} error: {error(features, results, vector, k):.6f}")
+
+    start = time.perf_counter()
+    vector = tune(features, results, vector, k, args.epochs, args.rate, frozen)
+    print(f"tuned in {time.perf_counter() - start:.1f}s")
+
+    save_weights(batcheval.weights_from_vector(vector), args.output)
+    print(f"weights written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
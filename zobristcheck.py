@@ -0,0 +1,127 @@
+"""
+Checks the incremental Zobrist key of the SearchBoard against chess.polyglot.zobrist_hash.
+
+Plays random standard and Chess960 games. A few plies into every game the
+board is copied with SearchBoard.from_board, which replays the reversible
+moves of the game history, and the rest of the game is pushed on the copy
+and on the chess.Board, then popped back past the copy's start. After every
+push and pop the key must equal zobrist_hash of the chess.Board.
+
+    python zobristcheck.py
+    python zobristcheck.py --games 1000 --seed 7
+    python zobristcheck.py --repetition
+"""
+
+import argparse
+import random
+import chess
+import chess.polyglot
+from searchboard import SearchBoard
+
+
+def check_game(rng, chess960):
+    """Plays one random game, returns the number of keys compared and a list of mismatches."""
+    board = chess.Board.from_chess960_pos(rng.randrange(960)) if chess960 else chess.Board()
+    board.chess960 = chess960
+    for ply in range(rng.randrange(0, 12)):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(rng.choice(moves))
+
+    search_board = SearchBoard.from_board(board)
+    errors = []
+    checked = 0
+
+    def check(what):
+        nonlocal checked
+        checked += 1
+        if search_board.key != chess.polyglot.zobrist_hash(board):
+            errors.append(f"{what} {board.fen()}")
+
+    check("start")
+    while not board.is_game_over() and board.ply() < 300:
+        move = rng.choice(list(board.legal_moves))
+        board.push(move)
+        search_board.push(search_board.from_chess_move(move))
+        check(f"push {move.uci()}")
+    while search_board.stack:
+        search_board.pop()
+        move = board.pop()
+        check(f"pop {move.uci()}")
+    return checked, errors
+
+
+def check_repetitions(rng, chess960):
+    """
+    Plays one random game that often moves a piece back, returns the number of
+    positions compared and a list of mismatches.
+
+    At every ply SearchBoard.from_board of the game must see a repetition
+    exactly when chess.Board.is_repetition(3) does. A second SearchBoard,
+    copied a few plies into the game and pushed along as the search would,
+    must see one as soon as the position occurred once after its copy or
+    twice before it.
+    """
+    board = chess.Board.from_chess960_pos(rng.randrange(960)) if chess960 else chess.Board()
+    board.chess960 = chess960
+    keys = [chess.polyglot.zobrist_hash(board)]
+    root = rng.randrange(0, 12)
+    search_board = SearchBoard.from_board(board) if root == 0 else None
+    errors = []
+    checked = 0
+    while not board.is_game_over() and board.ply() < 200:
+        move = None
+        if len(board.move_stack) >= 2 and rng.random() < 0.7:
+            back = board.move_stack[-2]
+            move = chess.Move(back.to_square, back.from_square)
+            if not board.is_legal(move):
+                move = None
+        move = move or rng.choice(list(board.legal_moves))
+        board.push(move)
+        keys.append(chess.polyglot.zobrist_hash(board))
+        if search_board is not None:
+            search_board.push(search_board.from_chess_move(move))
+        elif board.ply() == root:
+            search_board = SearchBoard.from_board(board)
+
+        checked += 1
+        if SearchBoard.from_board(board).repetition() != board.is_repetition(3):
+            errors.append(f"root {board.fen()} after {' '.join(move.uci() for move in board.move_stack)}")
+        if search_board is not None:
+            ply = len(keys) - 1
+            earlier = [index for index in range(max(0, ply - board.halfmove_clock), ply) if keys[index] == keys[ply]]
+            expected = any(index >= root for index in earlier) or len(earlier) >= 2
+            if search_board.repetition() != expected:
+                errors.append(f"search from ply {root} {board.fen()} after {' '.join(move.uci() for move in board.move_stack)}")
+    return checked, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the SearchBoard Zobrist keys against zobrist_hash")
+    parser.add_argument("--games", type=int, default=200, help="Random games of each variant.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random games.")
+    parser.add_argument("--repetition", action="store_true",
+                        help="Check SearchBoard.repetition against is_repetition instead of the keys.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failed = False
+    for chess960 in (False, True):
+        checked = 0
+        errors = []
+        for game in range(args.games):
+            game_checked, game_errors = (check_repetitions if args.repetition else check_game)(rng, chess960)
+            checked += game_checked
+            errors += game_errors
+        print(f"{'chess960' if chess960 else 'standard':<9} games: {args.games} "
+              f"{'positions' if args.repetition else 'keys'}: {checked} mismatches: {len(errors)}")
+        for error in errors[:10]:
+            print(f"    {error}")
+        failed = failed or bool(errors)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()